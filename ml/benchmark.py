@@ -0,0 +1,255 @@
+import os
+import sys
+import argparse
+import csv
+import json
+import platform
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+# Headless pygame
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+import numpy as np
+import pygame
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "ml"))
+
+from sim.race import RaceState
+from sim.traffic import update_traffic_factors
+from ml.collect_data import DT, STYLES, make_track, race_rng, run_race, run_races
+from ml.features import FEATURE_NAMES, extract, extract_batch
+from ml.oracle import label, label_batch
+from nn_numpy import SGD, Network, init_params, forward, backward, update_params
+from train import load_data
+
+RESULTS_PATH = ROOT / "data" / "benchmark.json"
+BASELINE_PATH = ROOT / "data" / "benchmark_baseline.json"
+TOLERANCE = 0.25  # a benchmark more than 25% slower than the baseline is a regression
+
+FIELD_SIZES = [5, 20, 100]
+BATCH_SIZES = [1, 64, 1024, 16384]
+DATASET_ROWS = [1000, 10000, 100000]
+RACE_BATCHES = [1, 100]
+WARMUP_FRAMES = 1200  # 20 s of racing before per-car benchmarks, so state is mid-race
+
+
+def measure(fn, units=1, repeat=5, calibrate=True):
+    """Best-of-*repeat* seconds per unit of work for *fn* (which performs *units* units per call).
+
+    With *calibrate* each repeat loops *fn* for at least 0.2 s; otherwise it is
+    called once per repeat (for slow cases such as whole races).
+    """
+    timer = timeit.Timer(fn)
+    number = timer.autorange()[0] if calibrate else 1
+    return min(timer.repeat(repeat=repeat, number=number)) / number / units
+
+
+# ---- fixtures -----------------------------------------------------------------
+
+def make_race_state(track, n_races, seed=0, n_cars=5):
+    state = RaceState(track, [[STYLES[k % len(STYLES)] for k in range(n_cars)]] * n_races,
+                      rngs=[race_rng(seed, k) for k in range(n_races)])
+    for _ in range(WARMUP_FRAMES):
+        state.step(DT)
+    return state
+
+
+def make_cars(n, track, seed=0):
+    """The *n* Car views of a single race, after WARMUP_FRAMES of racing."""
+    return make_race_state(track, 1, seed, n).race_cars(0)
+
+
+def write_dataset(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((rows, len(FEATURE_NAMES)))
+    y = rng.integers(0, 2, rows)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FEATURE_NAMES + ["label"])
+        writer.writerows([*x, lab] for x, lab in zip(X.tolist(), y.tolist()))
+
+
+# ---- benchmarks ---------------------------------------------------------------
+# Each entry maps a name to (seconds per unit, unit).
+
+def bench_sim(results, quick):
+    repeat = 2 if quick else 5
+    track = make_track()
+    cars = make_cars(5, track)
+
+    for n in FIELD_SIZES:
+        field = make_cars(n, track) if n != 5 else cars
+        results[f"update_traffic_factors[{n}]"] = (
+            measure(lambda: update_traffic_factors(field), repeat=repeat), "call")
+
+    for n_races in RACE_BATCHES:
+        state = make_race_state(track, n_races)
+        results[f"race_state_step[{n_races}]"] = (
+            measure(lambda: state.step(DT), units=state.lap_count.size, repeat=repeat), "car-frame")
+
+    results["run_race"] = (
+        measure(lambda: run_race(track, race_rng(0, 0)), repeat=1 if quick else 3, calibrate=False), "race")
+    results["run_race[event]"] = (
+        measure(lambda: run_race(track, race_rng(0, 0), engine="event"), repeat=1 if quick else 3,
+                calibrate=False), "race")
+    if not quick:
+        results["run_races[100]"] = (
+            measure(lambda: run_races(track, [race_rng(0, k) for k in range(100)]), units=100,
+                    repeat=1, calibrate=False), "race")
+
+
+def bench_features(results, quick):
+    repeat = 2 if quick else 5
+    track = make_track()
+    cars = make_cars(5, track)
+    car = cars[0]
+    results["extract"] = (measure(lambda: extract(car, cars, False, 50), repeat=repeat), "row")
+
+    feat, _ = extract(car, cars, False, 50)
+    results["label"] = (measure(lambda: label(feat), repeat=repeat), "row")
+
+    state = make_race_state(track, 100)
+    races, slots = np.divmod(np.arange(state.lap_count.size), state.lap_count.shape[1])
+    results["extract_batch[500]"] = (
+        measure(lambda: extract_batch(state, races, slots, 50), units=len(races), repeat=repeat), "row")
+    X = extract_batch(state, races, slots, 50)
+    results["label_batch[500]"] = (measure(lambda: label_batch(X), units=len(X), repeat=repeat), "row")
+
+
+def bench_nn(results, quick):
+    repeat = 2 if quick else 5
+    params = init_params(seed=0)
+    rng = np.random.default_rng(0)
+    for m in BATCH_SIZES:
+        X = rng.standard_normal((m, len(FEATURE_NAMES)))
+        y = rng.integers(0, 2, (m, 1)).astype(np.float64)
+        _, cache = forward(X, params)
+        results[f"forward[{m}]"] = (measure(lambda: forward(X, params), repeat=repeat), "call")
+        results[f"backward[{m}]"] = (measure(lambda: backward(params, cache, y), repeat=repeat), "call")
+
+        def functional_step():
+            _, cache = forward(X, params)
+            update_params(params, backward(params, cache, y), lr=1e-6)
+        results[f"train_step[{m}]"] = (measure(functional_step, repeat=repeat), "call")
+
+        net, opt = Network(init_params(seed=0), m), SGD(lr=1e-6)
+
+        def network_step():
+            net.forward(X)
+            net.backward(y)
+            net.step(opt)
+        results[f"network_train_step[{m}]"] = (measure(network_step, repeat=repeat), "call")
+
+    params32 = init_params(seed=0, dtype=np.float32)
+    for m in BATCH_SIZES[1:]:
+        X = rng.standard_normal((m, len(FEATURE_NAMES))).astype(np.float32)
+        results[f"forward_float32[{m}]"] = (measure(lambda: forward(X, params32), repeat=repeat), "call")
+
+
+def bench_load_data(results, quick):
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in DATASET_ROWS[:-1] if quick else DATASET_ROWS:
+            path = Path(tmp) / f"dataset_{rows}.csv"
+            write_dataset(path, rows)
+            results[f"load_data[{rows}]"] = (
+                measure(lambda: load_data(path), units=rows, repeat=3, calibrate=False), "row")
+
+
+GROUPS = {
+    "sim": bench_sim,
+    "features": bench_features,
+    "nn": bench_nn,
+    "load_data": bench_load_data,
+}
+
+
+# ---- reporting ----------------------------------------------------------------
+
+def format_seconds(s):
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("µs", 1e-6)):
+        if s >= scale:
+            return f"{s / scale:8.2f} {unit}"
+    return f"{s / 1e-9:8.2f} ns"
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return [(name, seconds, baseline seconds, ratio)] for benchmarks slower than the baseline allows."""
+    regressions = []
+    for name, entry in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        ratio = entry["seconds"] / ref["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, entry["seconds"], ref["seconds"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the sim, feature, NN and data hot paths")
+    parser.add_argument("--group", action="append", choices=list(GROUPS), dest="groups",
+                        help="benchmark group to run; repeatable (default: all)")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats, skip the largest cases")
+    parser.add_argument("--out", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown before a benchmark is flagged (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    pygame.init()
+
+    raw = {}
+    for group in args.groups or GROUPS:
+        t0 = time.perf_counter()
+        GROUPS[group](raw, args.quick)
+        print(f"  [{group}] done in {time.perf_counter() - t0:.1f} s")
+
+    results = {name: {"seconds": s, "unit": unit} for name, (s, unit) in raw.items()}
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"\n{'benchmark':<28} {'time':>11}  {'per':<10} {'baseline':>11}  change")
+    for name, entry in results.items():
+        line = f"{name:<28} {format_seconds(entry['seconds'])}  {entry['unit']:<10}"
+        ref = baseline.get(name)
+        if ref is not None:
+            line += f" {format_seconds(ref['seconds'])}  {entry['seconds'] / ref['seconds'] - 1:+.0%}"
+        print(line)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    out = args.baseline if args.save_baseline else args.out
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {out}")
+    pygame.quit()
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for name, s, ref, ratio in regressions:
+            print(f"  {name}: {format_seconds(s).strip()} vs {format_seconds(ref).strip()} ({ratio:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
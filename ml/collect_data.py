@@ -1,147 +1,325 @@
 import os
 import sys
-import csv
-import math
-import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import Manager
+from queue import Empty
+from itertools import repeat
 from pathlib import Path
 
 # Headless pygame
 os.environ["SDL_VIDEODRIVER"] = "dummy"
 
+import numpy as np
 import pygame
 
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-from sim.car import Car
+from sim.event_race import EventRaceState
+from sim.instrument import Instrumentation
+from sim.race import RaceState
 from sim.track import Track
-from ml.features import extract, FEATURE_NAMES
-from ml.oracle import label
-
-TRAFFIC_THRESHOLD_ANGLE = 0.20
-TRAFFIC_FACTOR_MIN = 0.75
-TRAFFIC_FACTOR_MAX = 0.90
-TWO_PI = 2 * math.pi
-SC_TRIGGER_CHANCE = 0.003
-SC_DURATION_MIN = 4.0
-SC_DURATION_MAX = 8.0
-SC_COOLDOWN = 15.0
-SC_FACTOR_MIN = 0.60
-SC_FACTOR_MAX = 0.80
-PIT_WEAR_THRESHOLD = 0.75
+from ml.dataset_io import DatasetWriter
+from ml.features import batch_rows, extract_batch, lap_inputs
+from ml.inference import apply_pit_recommendations
+from ml.lap_cache import CACHE_CHUNK, LapCache, concat_laps, feature_version, oracle_version, physics_version
+from ml.oracle import label_batch
 
 TOTAL_LAPS = 50
 NUM_RACES = 100
+BATCH_SIZE = 1000
+SEED = 42
 MAX_FRAMES = 200000
+QUEUE_POLL = 1.0  # seconds between checks for failed workers while waiting for races
 FPS = 60
 DT = 1.0 / FPS
 
 STYLES = ["aggressive", "normal", "conservative"]
 
+# "frame" steps every race at FPS; "event" jumps from event to event (statistically equivalent)
+ENGINES = {"frame": RaceState, "event": EventRaceState}
+ENGINE = "frame"
 
-def update_traffic_factors(cars):
-    for c in cars:
-        gap = TWO_PI
-        for other in cars:
-            if other is c:
-                continue
-            diff = (other.angle - c.angle) % TWO_PI
-            if 0 < diff < gap:
-                gap = diff
-        if gap >= TRAFFIC_THRESHOLD_ANGLE:
-            c.traffic_factor = 1.0
-        else:
-            t = gap / TRAFFIC_THRESHOLD_ANGLE if TRAFFIC_THRESHOLD_ANGLE > 0 else 1.0
-            c.traffic_factor = TRAFFIC_FACTOR_MIN + (TRAFFIC_FACTOR_MAX - TRAFFIC_FACTOR_MIN) * t
-
-
-def make_cars(track):
-    spacing = TWO_PI / 5
-    cars = []
-    for i in range(5):
-        style = random.choice(STYLES)
-        cars.append(Car(
-            angle=spacing * i,
-            speed=1.0,
-            center_x=track.center_x,
-            center_y=track.center_y,
-            radius_x=track.centerline_rx,
-            radius_y=track.centerline_ry,
-            color=(0, 0, 0),
-            car_id=i + 1,
-            driving_style=style,
-        ))
-    return cars
-
-
-def run_race(track):
-    cars = make_cars(track)
-
-    safety_car_active = False
-    safety_car_timer = 0.0
-    safety_car_cooldown = 0.0
-    sc_factor = 1.0
-
-    rows = []
+
+def race_rng(seed, race_index):
+    """Independent random stream for race *race_index* of a run seeded with *seed*."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(race_index,)))
+
+
+def make_races(track, rngs, engine=ENGINE):
+    styles = [[STYLES[k] for k in rng.integers(len(STYLES), size=5)] for rng in rngs]
+    return ENGINES[engine](track, styles, base_speed=1.0, rngs=rngs)
+
+
+def iter_races(track, rngs, predictor=None, instrumentation=None, engine=ENGINE, laps=None):
+    """Simulate one race per generator as a single batch; yield ``(race, rows)`` as each race finishes.
+
+    Races are yielded in the order they finish, *race* being the index of
+    their generator in *rngs*.
+
+    With a *predictor* the NN-auto pit policy is applied: every lap completion
+    of a frame, across all races, is scored in one batched forward pass.
+    With an *instrumentation* (sim.instrument.Instrumentation) the simulation
+    phases, feature extraction, labeling and NN inference are timed.
+    *engine* picks the simulator (see ENGINES); with "event" every step runs to
+    the next event, so MAX_FRAMES caps steps rather than 60 Hz frames.
+    With a *laps* list, the raw lap_inputs of every row are appended to it as
+    ``(races, inputs)`` once per step (see ml.lap_cache.concat_laps).
+    """
+    state = make_races(track, rngs, engine)
+    extract, label = extract_batch, label_batch
+    predict = predictor.predict_proba if predictor is not None else None
+    if instrumentation is not None:
+        instrumentation.instrument_race(state)
+        extract = instrumentation.timed("features", extract)
+        label = instrumentation.timed("labeling", label)
+        if predict is not None:
+            predict = instrumentation.timed("nn_inference", predict)
+
+    rows = [[] for _ in range(state.n_races)]
+    active = np.ones(state.n_races, dtype=bool)
     frame = 0
 
     while frame < MAX_FRAMES:
-        if safety_car_active:
-            safety_car_timer -= DT
-            if safety_car_timer <= 0:
-                safety_car_active = False
-                safety_car_cooldown = SC_COOLDOWN
-                sc_factor = 1.0
-        else:
-            safety_car_cooldown = max(0.0, safety_car_cooldown - DT)
-            if safety_car_cooldown == 0.0 and random.random() < SC_TRIGGER_CHANCE:
-                safety_car_active = True
-                safety_car_timer = random.uniform(SC_DURATION_MIN, SC_DURATION_MAX)
-                sc_factor = random.uniform(SC_FACTOR_MIN, SC_FACTOR_MAX)
-
-        update_traffic_factors(cars)
-        for c in cars:
-            c.sc_factor = sc_factor
-            if not c.wants_pit and not c.in_pit and c.tire_wear >= PIT_WEAR_THRESHOLD:
-                c.wants_pit = True
-            old_lap = c.lap_count
-            c.update(DT, track)
-            if c.lap_count > old_lap and 1 <= c.lap_count <= TOTAL_LAPS:
-                feat_dict, feat_row = extract(c, cars, safety_car_active, TOTAL_LAPS)
-                lab = label(feat_dict)
-                rows.append(feat_row + [lab])
-
-        if all(c.lap_count >= TOTAL_LAPS for c in cars):
-            break
+        lapped = state.step(DT, active)
+        races, slots = np.nonzero(lapped)
+        if len(races):
+            X = extract(state, races, slots, TOTAL_LAPS)
+            if predict is not None:
+                apply_pit_recommendations(state, races, slots, predict(X))
+            keep = state.lap_count[races, slots] <= TOTAL_LAPS
+            if laps is not None:
+                laps.append((races[keep], lap_inputs(state, races[keep], slots[keep])))
+            for r, row in zip(races[keep].tolist(), batch_rows(X[keep], label(X[keep]))):
+                rows[r].append(row)
+
+        finished = active & (state.lap_count >= TOTAL_LAPS).all(axis=1)
+        if finished.any():
+            active &= ~finished
+            for r in np.flatnonzero(finished).tolist():
+                yield r, rows[r]
+                rows[r] = None
+            if not active.any():
+                return
         frame += 1
 
+    for r in np.flatnonzero(active).tolist():  # cut off by MAX_FRAMES
+        yield r, rows[r]
+
+
+def run_races(track, rngs, predictor=None, instrumentation=None, engine=ENGINE, laps=None):
+    """iter_races() run to the end; returns the rows of each race, in *rngs* order."""
+    rows = [None] * len(rngs)
+    for r, race_rows in iter_races(track, rngs, predictor, instrumentation, engine, laps):
+        rows[r] = race_rows
     return rows
 
 
+def run_race(track, rng=None, predictor=None, instrumentation=None, engine=ENGINE):
+    rngs = [rng if rng is not None else np.random.default_rng()]
+    return run_races(track, rngs, predictor, instrumentation, engine)[0]
+
+
+def make_track():
+    return Track.oval(center_x=600, center_y=400, radius_x=400, radius_y=250)
+
+
+def finished_races(start, stop, seed, instrumentation=None, engine=ENGINE):
+    """Yield ``(race index, rows)`` for races ``start..stop-1``, simulated as one batch, as each finishes."""
+    rngs = [race_rng(seed, k) for k in range(start, stop)]
+    for r, rows in iter_races(make_track(), rngs, instrumentation=instrumentation, engine=engine):
+        yield start + r, rows
+
+
+def simulate_chunk(start, stop, seed, queue, profile=False, trace=False, engine=ENGINE):
+    """Run races ``start..stop-1`` in a worker process, putting each on *queue* as it finishes.
+
+    Returns the chunk's instrumentation, which is None unless *profile*.
+    """
+    instrumentation = Instrumentation(trace) if profile else None
+    for item in finished_races(start, stop, seed, instrumentation, engine):
+        queue.put(item)
+    return instrumentation
+
+
+def simulate_lap_chunk(start, stop, seed, engine=ENGINE):
+    """Raw lap inputs of races ``start..stop-1`` in dataset row order, for a LapCache (runs in workers)."""
+    laps = []
+    run_races(make_track(), [race_rng(seed, k) for k in range(start, stop)], engine=engine, laps=laps)
+    return concat_laps(laps, offset=start)
+
+
+def lap_cache(seed, engine=ENGINE):
+    """The LapCache for runs with *seed* and *engine* under the current simulator, feature and oracle code."""
+    track = make_track()
+    params = {"seed": seed, "total_laps": TOTAL_LAPS, "dt": DT, "max_frames": MAX_FRAMES, "styles": STYLES,
+              "pit_entry_angle": track.pit_entry_angle, "pit_exit_angle": track.pit_exit_angle}
+    physics = physics_version(engine, (race_rng, make_races, iter_races, make_track), params)
+    return LapCache(f"{engine}-{physics}", feature_version(TOTAL_LAPS), oracle_version(), TOTAL_LAPS)
+
+
+def cached_races(cache, chunks, seed, workers=1, engine=ENGINE):
+    """Yield ``(stop, rows per race)`` for each chunk from *cache*, simulating only the races it lacks.
+
+    Missing races are simulated (in a process pool with several workers, split
+    so that every worker gets a share even when few chunks are missing) and
+    added to their chunk's file as they come in; features and labels are then
+    read from the cache, which computes them only for versions it has not seen.
+    """
+    plan = [(start, stop, cache.cached_stop(start)) for start, stop in chunks]
+    missing = [(max(cached, start), stop) for start, stop, cached in plan if cached < stop]
+    size = max(1, -(-sum(stop - start for start, stop in missing) // workers))
+    pieces = [race_chunks(stop, size, start) for start, stop in missing]
+    flat = [piece for chunk_pieces in pieces for piece in chunk_pieces]
+    args = (simulate_lap_chunk, [p[0] for p in flat], [p[1] for p in flat], repeat(seed), repeat(engine))
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(flat) > 1 else nullcontext() as pool:
+        simulated = pool.map(*args) if pool is not None else map(*args)
+        chunk_pieces = iter(pieces)
+        for start, stop, cached in plan:
+            if cached < stop:
+                parts = [next(simulated) for _ in next(chunk_pieces)]
+                laps = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+                cache.extend_laps(start, cached, stop, laps)
+            race_index, X, y = cache.rows(start, stop)
+            bounds = np.searchsorted(race_index, np.arange(start, stop + 1)).tolist()
+            rows = batch_rows(X, y)
+            yield stop, [rows[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def race_chunks(num_races, chunk_size, start=0):
+    return [(s, min(s + chunk_size, num_races)) for s in range(start, num_races, chunk_size)]
+
+
+def simulate_races(chunks, seed, workers=1, instrumentation=None, engine=ENGINE):
+    """Yield ``(stop, rows per race)`` for runs of consecutive races, in race order, as they finish.
+
+    Each chunk is simulated as one batch, in a process pool with several
+    workers. Its races are handed back one by one as they finish and held only
+    until every earlier race is done, so the output does not depend on timing
+    and a writer can commit each race as soon as it can be appended.
+    Chunk timings are merged into *instrumentation* when one is given.
+    """
+    if not chunks:
+        return
+    profile = instrumentation is not None
+    trace = profile and instrumentation.trace
+    if workers > 1:
+        finished = _pooled_races(chunks, seed, workers, instrumentation, profile, trace, engine)
+    else:
+        finished = _serial_races(chunks, seed, instrumentation, profile, trace, engine)
+
+    next_race, pending = chunks[0][0], {}
+    for race, rows in finished:
+        pending[race] = rows
+        run = []
+        while next_race in pending:
+            run.append(pending.pop(next_race))
+            next_race += 1
+        if run:
+            yield next_race, run
+
+
+def _serial_races(chunks, seed, instrumentation, profile, trace, engine):
+    for start, stop in chunks:
+        chunk_instrumentation = Instrumentation(trace) if profile else None
+        yield from finished_races(start, stop, seed, chunk_instrumentation, engine)
+        if instrumentation is not None:
+            instrumentation.merge(chunk_instrumentation)
+
+
+def _pooled_races(chunks, seed, workers, instrumentation, profile, trace, engine):
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = manager.Queue()
+        futures = [pool.submit(simulate_chunk, start, stop, seed, queue, profile, trace, engine)
+                   for start, stop in chunks]
+        for _ in range(sum(stop - start for start, stop in chunks)):
+            while True:
+                try:
+                    yield queue.get(timeout=QUEUE_POLL)
+                    break
+                except Empty:
+                    for future in futures:
+                        if future.done():
+                            future.result()  # re-raises a worker's exception
+        for future in futures:
+            if instrumentation is not None:
+                instrumentation.merge(future.result())
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Headless sim -> data/dataset.csv")
+    parser.add_argument("--races", type=int, default=NUM_RACES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="races simulated together as one array batch")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; output is identical for any count")
+    parser.add_argument("--engine", choices=list(ENGINES), default=ENGINE,
+                        help="frame: 60 Hz steps; event: jump between events (several times faster)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue after the last race committed to the dataset")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"keep raw per-lap state in data/cache/laps/ ({CACHE_CHUNK}-race chunks) and rebuild "
+                             "from it, simulating only races it lacks and recomputing only changed stages")
+    parser.add_argument("--npy", action="store_true",
+                        help="also write a memory-mappable binary dataset to data/dataset/")
+    parser.add_argument("--npy-dtype", choices=["float32", "float64"], default="float64")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-phase timings and event counts at the end")
+    parser.add_argument("--trace", type=Path, default=None,
+                        help="with --profile, also write a Chrome trace JSON to this path")
+    args = parser.parse_args()
+    if args.cache and (args.resume or args.profile):
+        parser.error("--cache rebuilds the whole dataset; it cannot be combined with --resume or --profile")
+
     pygame.init()
     pygame.display.set_mode((1, 1))
 
-    track = Track(center_x=600, center_y=400, radius_x=400, radius_y=250)
-    all_rows = []
+    out_path = ROOT / "data" / "dataset.csv"
+    npy_dir = ROOT / "data" / "dataset" if args.npy else None
+    writer = DatasetWriter(out_path, args.seed, resume=args.resume, npy_dir=npy_dir, npy_dtype=args.npy_dtype,
+                           engine=args.engine)
+    if writer.races_done:
+        print(f"  Resuming after race {writer.races_done} ({writer.rows} rows)")
 
-    for race in range(NUM_RACES):
-        rows = run_race(track)
-        all_rows.extend(rows)
-        if (race + 1) % 20 == 0:
-            print(f"  Race {race + 1}/{NUM_RACES} done — {len(all_rows)} rows so far")
+    chunk_size = args.batch_size
+    if args.workers > 1:
+        chunk_size = max(1, min(chunk_size, -(-args.races // args.workers)))
+    chunks = race_chunks(args.races, chunk_size, start=writer.races_done)
 
-    out_path = ROOT / "data" / "dataset.csv"
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(FEATURE_NAMES + ["label"])
-        w.writerows(all_rows)
-
-    pit_ratio = sum(r[-1] for r in all_rows) / len(all_rows) * 100 if all_rows else 0
-    print(f"\nWrote {len(all_rows)} rows to {out_path}")
+    instrumentation = Instrumentation(trace=args.trace is not None) if args.profile else None
+    write_races = writer.write_races
+    if instrumentation is not None:
+        write_races = instrumentation.timed("writing", write_races)
+    cache = lap_cache(args.seed, args.engine) if args.cache else None
+    if cache is not None:
+        results = cached_races(cache, race_chunks(args.races, CACHE_CHUNK), args.seed, args.workers, args.engine)
+    else:
+        results = simulate_races(chunks, args.seed, args.workers, instrumentation, args.engine)
+    chunk_stops = {stop for _, stop in chunks}
+    for stop, race_rows in results:
+        write_races(stop, race_rows)
+        if cache is not None or stop in chunk_stops:
+            print(f"  Race {stop}/{args.races} done — {writer.rows} rows so far")
+    writer.close()
+
+    pit_ratio = writer.pit_rows / writer.rows * 100 if writer.rows else 0
+    print(f"\nWrote {writer.rows} rows to {out_path}")
+    if writer.npy_dir is not None:
+        print(f"Wrote binary dataset to {writer.npy_dir}")
     print(f"Pit ratio: {pit_ratio:.1f}% (target 15–35%)")
+    if cache is not None:
+        computed = ", ".join(f"{k} {v}" for k, v in cache.computed.items())
+        print(f"Lap cache {cache.dir}: {computed}")
+    if instrumentation is not None:
+        instrumentation.stop()
+        print("\n" + instrumentation.summary())
+        if args.trace is not None:
+            instrumentation.write_trace(args.trace)
+            print(f"Wrote trace to {args.trace}")
     pygame.quit()
 
 
@@ -0,0 +1,243 @@
+import os
+import sys
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+# Headless pygame
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+import numpy as np
+import pygame
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ml.collect_data import DT, ENGINES, MAX_FRAMES, TOTAL_LAPS, make_races, make_track, race_chunks, race_rng
+from ml.features import extract_batch
+from ml.inference import apply_pit_recommendations
+from ml.registry import MODEL_PATH, load_model
+
+NUM_RACES = 100
+SEED = 42
+CSV_PATH = ROOT / "data" / "strategy_comparison.csv"
+PNG_PATH = ROOT / "data" / "strategy_comparison.png"
+POLICIES = ["baseline", "nn_auto"]
+ENGINE = "frame"  # the game's engine; "event" is faster but only statistically equivalent, so its numbers differ
+Z_95 = 1.96
+
+CSV_COLUMNS = [
+    "race",
+    "baseline_race_seconds", "nn_auto_race_seconds",
+    "baseline_lap_seconds", "nn_auto_lap_seconds",
+    "baseline_pit_stops", "nn_auto_pit_stops",
+]
+
+
+def race_times(track, rngs, predictor=None, engine=ENGINE):
+    """Simulate one race per generator; return per-car finish times and pit stops.
+
+    Without a *predictor* only the ``PIT_WEAR_THRESHOLD`` rule pits cars
+    (baseline). With one, NN recommendations are applied on top of it at every
+    lap completion, as in the game's AUTO mode. Finish times are simulated
+    seconds: frames x DT with the frame engine, each race's own clock with the
+    event engine.
+    """
+    state = make_races(track, rngs, engine)
+    finish = np.full(state.lap_count.shape, np.inf)
+    active = np.ones(state.n_races, dtype=bool)
+    frame = 0
+
+    while frame < MAX_FRAMES:
+        lapped = state.step(DT, active)
+        frame += 1
+        if lapped.any():
+            if predictor is not None:
+                races, slots = np.nonzero(lapped)
+                X = extract_batch(state, races, slots, TOTAL_LAPS)
+                apply_pit_recommendations(state, races, slots, predictor.predict_proba(X))
+            done = lapped & (state.lap_count == TOTAL_LAPS)
+            if engine == "event":
+                finish[done] = np.broadcast_to(state.time[:, np.newaxis], finish.shape)[done]
+            else:
+                finish[done] = frame * DT
+            active &= ~np.isfinite(finish).all(axis=1)
+            if not active.any():
+                break
+
+    return finish, state.pit_stops.copy()
+
+
+def compare_chunk(start, stop, seed, model_path, engine=ENGINE):
+    """Paired results for races ``start..stop-1`` (runs in worker processes).
+
+    Both policies see identical random streams, so each race differs only in
+    its pit decisions.
+    """
+    predictor = load_model(model_path).predictor()
+    results = {}
+    for policy in POLICIES:
+        rngs = [race_rng(seed, k) for k in range(start, stop)]
+        results[policy] = race_times(make_track(), rngs, predictor if policy == "nn_auto" else None, engine)
+    return results
+
+
+def compare_races(num_races, seed, model_path, workers=1, batch_size=None, engine=ENGINE):
+    """Return {policy: (finish times (races, cars), pit stops (races, cars))} for all races."""
+    chunk_size = batch_size or num_races
+    if workers > 1:
+        chunk_size = max(1, min(chunk_size, -(-num_races // workers)))
+    chunks = race_chunks(num_races, chunk_size)
+    starts = [c[0] for c in chunks]
+    stops = [c[1] for c in chunks]
+    args = (compare_chunk, starts, stops, repeat(seed), repeat(model_path), repeat(engine))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(*args))
+    else:
+        parts = list(map(*args))
+    return {
+        policy: tuple(np.concatenate([p[policy][k] for p in parts]) for k in range(2))
+        for policy in POLICIES
+    }
+
+
+def mean_ci(values):
+    """Mean and 95% confidence half-width (normal approximation)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return float(values.mean()), 0.0
+    return float(values.mean()), float(Z_95 * values.std(ddof=1) / np.sqrt(len(values)))
+
+
+def summarize(results):
+    """Per-race race seconds, lap seconds and pit stops for each policy.
+
+    Race seconds run until the last car is home. Lap seconds are race
+    seconds per lap completed by the whole field (``TOTAL_LAPS`` x cars),
+    as in the original Sprint 5 comparison.
+    """
+    summary = {}
+    for policy in POLICIES:
+        finish, pits = results[policy]
+        race_seconds = finish.max(axis=1)
+        summary[policy] = {
+            "race_seconds": race_seconds,
+            "lap_seconds": race_seconds / (TOTAL_LAPS * finish.shape[1]),
+            "pit_stops": pits.sum(axis=1),
+        }
+    return summary
+
+
+def write_csv(path, summary):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    base, nn = summary["baseline"], summary["nn_auto"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for k in range(len(base["race_seconds"])):
+            writer.writerow([
+                k,
+                f"{base['race_seconds'][k]:.4f}", f"{nn['race_seconds'][k]:.4f}",
+                f"{base['lap_seconds'][k]:.6f}", f"{nn['lap_seconds'][k]:.6f}",
+                int(base["pit_stops"][k]), int(nn["pit_stops"][k]),
+            ])
+
+
+def write_plot(path, summary):
+    """Bar charts of mean race seconds, lap seconds and pit stops per policy with 95% CI whiskers, drawn with pygame."""
+    panels = [("race_seconds", "Avg race seconds", "{:.2f}"), ("lap_seconds", "Avg lap seconds", "{:.4f}"),
+              ("pit_stops", "Avg pit stops", "{:.2f}")]
+    panel_w, height, margin = 320, 420, 50
+    width = panel_w * len(panels)
+    surface = pygame.Surface((width, height))
+    surface.fill((255, 255, 255))
+    font = pygame.font.Font(None, 24)
+    small = pygame.font.Font(None, 20)
+    colors = [(120, 120, 120), (40, 110, 200)]
+    names = {"baseline": "Baseline", "nn_auto": "NN Auto"}
+    bar_w = (panel_w - 2 * margin) // (2 * len(POLICIES))
+    base = height - margin
+
+    for p, (key, heading, fmt) in enumerate(panels):
+        left = p * panel_w + margin
+        stats = [mean_ci(summary[policy][key]) for policy in POLICIES]
+        scale = (height - 3 * margin) / (max(m + ci for m, ci in stats) * 1.05)
+        pygame.draw.line(surface, (0, 0, 0), (left, base), (left + panel_w - 2 * margin, base), 2)
+        text = font.render(heading, True, (0, 0, 0))
+        surface.blit(text, (p * panel_w + (panel_w - text.get_width()) // 2, 50))
+        for k, (policy, (m, ci)) in enumerate(zip(POLICIES, stats)):
+            x = left + bar_w // 2 + k * 2 * bar_w
+            h = int(m * scale)
+            pygame.draw.rect(surface, colors[k], (x, base - h, bar_w, h))
+            cx = x + bar_w // 2
+            lo, hi = base - int((m - ci) * scale), base - int((m + ci) * scale)
+            pygame.draw.line(surface, (0, 0, 0), (cx, lo), (cx, hi), 2)
+            pygame.draw.line(surface, (0, 0, 0), (cx - 8, hi), (cx + 8, hi), 2)
+            pygame.draw.line(surface, (0, 0, 0), (cx - 8, lo), (cx + 8, lo), 2)
+            value = small.render(fmt.format(m), True, (0, 0, 0))
+            surface.blit(value, (cx - value.get_width() // 2, hi - value.get_height() - 4))
+            label = small.render(names[policy], True, (0, 0, 0))
+            surface.blit(label, (cx - label.get_width() // 2, base + 10))
+
+    n = len(summary["baseline"]["race_seconds"])
+    title = font.render(f"Strategy comparison, {n} paired races (95% CI)", True, (0, 0, 0))
+    surface.blit(title, ((width - title.get_width()) // 2, 15))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pygame.image.save(surface, str(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paired baseline vs NN-auto strategy comparison")
+    parser.add_argument("--races", type=int, default=NUM_RACES)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; results are identical for any count")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="races simulated together as one array batch (default: all)")
+    parser.add_argument("--engine", choices=list(ENGINES), default=ENGINE,
+                        help="frame (default): 60 Hz steps as in the game; event: jump between events (faster, "
+                             "statistically equivalent; compare only runs made with the same engine)")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--csv", type=Path, default=CSV_PATH)
+    parser.add_argument("--png", type=Path, default=PNG_PATH)
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()
+
+    pygame.init()
+
+    t0 = time.perf_counter()
+    results = compare_races(args.races, args.seed, args.model, args.workers, args.batch_size, args.engine)
+    elapsed = time.perf_counter() - t0
+    summary = summarize(results)
+
+    print(f"Strategy comparison: {args.races} races, seed {args.seed}, {args.engine} engine, "
+          f"same seeds for both policies")
+    print(f"  (results depend on the engine: compare only against runs made with --engine {args.engine})")
+    for policy in POLICIES:
+        race_m, race_ci = mean_ci(summary[policy]["race_seconds"])
+        lap_m, lap_ci = mean_ci(summary[policy]["lap_seconds"])
+        pits = summary[policy]["pit_stops"].mean()
+        print(f"  {policy:<9} race seconds {race_m:8.2f} ± {race_ci:.2f} | "
+              f"lap seconds {lap_m:.4f} ± {lap_ci:.4f} | pit stops/race {pits:.2f}")
+    gain_m, gain_ci = mean_ci(summary["baseline"]["race_seconds"] - summary["nn_auto"]["race_seconds"])
+    lap_gain_m, lap_gain_ci = mean_ci(summary["baseline"]["lap_seconds"] - summary["nn_auto"]["lap_seconds"])
+    print(f"  NN gain vs baseline: {gain_m:+.2f} ± {gain_ci:.2f} race sec, "
+          f"{lap_gain_m:+.4f} ± {lap_gain_ci:.4f} lap sec (paired, 95% CI)")
+    print(f"  Throughput: {2 * args.races / elapsed:.1f} races/sec "
+          f"({2 * args.races} races in {elapsed:.2f} s, {args.workers} worker(s))")
+
+    write_csv(args.csv, summary)
+    print(f"\nWrote {args.csv}")
+    if not args.no_plot:
+        write_plot(args.png, summary)
+        print(f"Wrote {args.png}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
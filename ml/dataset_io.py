@@ -0,0 +1,208 @@
+import csv
+import json
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES
+
+NPY_HEADER_LEN = 128  # fixed so the header can be rewritten in place as rows are appended
+
+
+def progress_path(path):
+    return path.with_name(path.name + ".progress.json")
+
+
+def _npy_header(shape, dtype):
+    """A .npy v1.0 header padded to exactly NPY_HEADER_LEN bytes."""
+    d = f"{{'descr': '{np.lib.format.dtype_to_descr(np.dtype(dtype))}', 'fortran_order': False, 'shape': {shape}, }}"
+    prefix_len = len(np.lib.format.magic(1, 0)) + 2
+    d = d.ljust(NPY_HEADER_LEN - prefix_len - 1) + "\n"
+    return np.lib.format.magic(1, 0) + struct.pack("<H", len(d)) + d.encode("latin1")
+
+
+class _NpyColumn:
+    """One .npy file that rows are appended to; its header always matches the committed rows."""
+
+    def __init__(self, path, dtype, width, rows=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        if rows is None:
+            self.rows = 0
+            self._f = open(path, "wb")
+            self._f.write(self._header())
+        else:
+            self.rows = rows
+            self._f = open(path, "r+b")
+            self._f.truncate(NPY_HEADER_LEN + rows * self.dtype.itemsize * max(width, 1))
+            self._f.seek(0, os.SEEK_END)
+
+    def _header(self):
+        shape = (self.rows, self.width) if self.width else (self.rows,)
+        return _npy_header(shape, self.dtype)
+
+    def append(self, values):
+        arr = np.ascontiguousarray(values, dtype=self.dtype)
+        self._f.write(arr.tobytes())
+        self.rows += len(arr)
+
+    def commit(self):
+        self._f.seek(0)
+        self._f.write(self._header())
+        self._f.seek(0, os.SEEK_END)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class DatasetWriter:
+    """Streams dataset rows to CSV, committing them as races finish.
+
+    After every :meth:`write_races` the file is flushed to disk and a small
+    progress file records how many races, rows and bytes are complete.
+    ``resume=True`` truncates anything written after the last commit and
+    continues from that race index, so a crash only loses the races that were
+    still running (and any finished ones waiting for an earlier race).
+
+    With *npy_dir* the same rows are also written as a columnar binary dataset:
+    ``X.npy`` (features), ``y.npy`` (uint8 labels) and ``header.json`` naming
+    the feature columns; see :func:`load_npy`. A resumed dataset that has a
+    binary copy keeps appending to it even when *npy_dir* is not given, so the
+    two never disagree. The progress file records *npy_dir* relative to the
+    CSV's directory, so a data directory can be moved or copied and resumed.
+    """
+
+    def __init__(self, path, seed, resume=False, npy_dir=None, npy_dtype="float64", engine="frame"):
+        self.path = path
+        self.seed = seed
+        self.engine = engine
+        self.npy_dir = npy_dir
+        self.races_done = 0
+        self.rows = 0
+        self.pit_rows = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        state = self._load_progress() if resume else None
+        if state is not None:
+            self.races_done = state["races_done"]
+            self.rows = state["rows"]
+            self.pit_rows = state["pit_rows"]
+            if npy_dir is None and state.get("npy_dir") is not None:
+                npy_dir = self.npy_dir = self._stored_npy_dir(state)
+            self._f = open(path, "r+", newline="")
+            self._f.truncate(state["bytes"])
+            self._f.seek(state["bytes"])
+            self._writer = csv.writer(self._f)
+        else:
+            self._f = open(path, "w", newline="")
+            self._writer = csv.writer(self._f)
+            self._writer.writerow(FEATURE_NAMES + ["label"])
+
+        self._X = self._y = None
+        if npy_dir is not None:
+            npy_dir.mkdir(parents=True, exist_ok=True)
+            rows = self.rows if state is not None else None
+            if rows is not None:
+                npy_dtype = read_npy_header(npy_dir)["dtype"]
+            else:
+                with open(npy_dir / "header.json", "w") as f:
+                    json.dump({"feature_names": FEATURE_NAMES, "dtype": np.dtype(npy_dtype).name}, f)
+            self._X = _NpyColumn(npy_dir / "X.npy", npy_dtype, len(FEATURE_NAMES), rows)
+            self._y = _NpyColumn(npy_dir / "y.npy", np.uint8, 0, rows)
+        self._commit()
+
+    def _load_progress(self):
+        p = progress_path(self.path)
+        if not (p.exists() and self.path.exists()):
+            return None
+        with open(p) as f:
+            state = json.load(f)
+        if state.get("seed") != self.seed:
+            raise ValueError(f"{p} was written with seed {state.get('seed')}, not {self.seed}")
+        if state.get("engine", "frame") != self.engine:
+            raise ValueError(f"{p} was written with the {state.get('engine', 'frame')} engine, not {self.engine}")
+        if self.npy_dir is not None and self._stored_npy_dir(state) != Path(os.path.abspath(self.npy_dir)):
+            raise ValueError(f"{p} was not written with a binary dataset in {self.npy_dir}")
+        return state
+
+    def _relative_npy_dir(self):
+        """npy_dir as the progress file stores it: relative to the CSV's directory."""
+        if self.npy_dir is None:
+            return None
+        return Path(os.path.relpath(self.npy_dir, self.path.parent)).as_posix()
+
+    def _stored_npy_dir(self, state):
+        """The progress file's npy_dir, resolved against the CSV's directory (None if it has none)."""
+        if state.get("npy_dir") is None:
+            return None
+        return Path(os.path.abspath(self.path.parent / state["npy_dir"]))
+
+    def write_races(self, stop, race_rows):
+        """Append the rows of consecutive races ending at race index *stop* and commit."""
+        for rows in race_rows:
+            self._writer.writerows(rows)
+            self.rows += len(rows)
+            self.pit_rows += sum(r[-1] for r in rows)
+            if self._X is not None and rows:
+                arr = np.array(rows, dtype=np.float64)
+                self._X.append(arr[:, :-1])
+                self._y.append(arr[:, -1])
+        self.races_done = stop
+        self._commit()
+
+    def _commit(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        if self._X is not None:
+            self._X.commit()
+            self._y.commit()
+        state = {
+            "seed": self.seed,
+            "engine": self.engine,
+            "races_done": self.races_done,
+            "rows": self.rows,
+            "pit_rows": self.pit_rows,
+            "bytes": self._f.tell(),
+            "npy_dir": self._relative_npy_dir(),
+        }
+        p = progress_path(self.path)
+        tmp = p.with_name(p.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, p)
+
+    def close(self):
+        self._f.close()
+        if self._X is not None:
+            self._X.close()
+            self._y.close()
+
+
+def save_npy(npy_dir, X, y, feature_names=FEATURE_NAMES):
+    """Write in-memory (X, y) as a binary dataset directory that :func:`load_npy` can map."""
+    npy_dir.mkdir(parents=True, exist_ok=True)
+    X = np.ascontiguousarray(X)
+    with open(npy_dir / "header.json", "w") as f:
+        json.dump({"feature_names": list(feature_names), "dtype": X.dtype.name}, f)
+    np.save(npy_dir / "X.npy", X)
+    np.save(npy_dir / "y.npy", np.asarray(y).reshape(-1).astype(np.uint8))
+
+
+def read_npy_header(npy_dir):
+    with open(npy_dir / "header.json") as f:
+        return json.load(f)
+
+
+def load_npy(npy_dir, feature_names=FEATURE_NAMES):
+    """Memory-map a binary dataset: X (n, n_features) and y (n, 1) uint8, no copies."""
+    header = read_npy_header(npy_dir)
+    if list(header["feature_names"]) != list(feature_names):
+        raise ValueError(f"{npy_dir} has features {header['feature_names']}, expected {feature_names}")
+    X = np.load(npy_dir / "X.npy", mmap_mode="r")
+    y = np.load(npy_dir / "y.npy", mmap_mode="r").reshape(-1, 1)
+    return X, y
@@ -1,12 +1,23 @@
+from pathlib import Path
+
 import numpy as np
 from train import (
     load_data,
     train_val_split,
     normalize_apply,
-    DATA_PATH,
+    evaluate_streaming,
+    build_parser,
+    check_out_of_core,
+    DTYPES,
     MODEL_PATH,
+    ROOT,
 )
-from nn_numpy import forward, compute_loss, predict
+from nn_numpy import forward, compute_loss
+from ml.registry import file_hash, load_model
+
+CACHE_DIR = ROOT / "data" / "cache"
+
+_normalized = {}  # (split key, mean bytes, std bytes) -> normalized X_val
 
 
 def confusion_counts(y_true, y_pred):
@@ -29,40 +40,50 @@ def metrics_from_counts(tp, tn, fp, fn):
     return acc, precision, recall, f1
 
 
-def load_saved_model(path):
-    data = np.load(path, allow_pickle=True)
-    params = {
-        "W1": data["W1"],
-        "b1": data["b1"],
-        "W2": data["W2"],
-        "b2": data["b2"],
-        "W3": data["W3"],
-        "b3": data["b3"],
-    }
-    mean = data["mean"]
-    std = data["std"]
-    feature_cols = data["feature_cols"].tolist()
-    return params, mean, std, feature_cols
+def dataset_files(path):
+    return [path / "header.json", path / "X.npy", path / "y.npy"] if path.is_dir() else [path]
 
 
-def main():
-    if not MODEL_PATH.exists():
-        print(f"Model file not found: {MODEL_PATH}")
-        print("Run `python ml/train.py` first.")
-        return
+def validation_split(path, dtype=np.float64, val_ratio=0.2, seed=42, cache_dir=CACHE_DIR):
+    """The raw validation rows of ``train_val_split``, cached on disk by the dataset's hash.
+
+    Returns (key, X_val, y_val). Only the first evaluation of a dataset
+    parses it; later ones load the cached rows.
+    """
+    key = f"{file_hash(*dataset_files(path))[:16]}-{val_ratio}-{seed}-{np.dtype(dtype).name}"
+    cache_path = cache_dir / f"val_{key}.npz"
+    if cache_path.exists():
+        with np.load(cache_path, allow_pickle=False) as data:
+            return key, data["X_val"], data["y_val"]
+
+    X, y = load_data(path, dtype)
+    _, _, X_val, y_val = train_val_split(X, y, val_ratio=val_ratio, seed=seed)
+    X_val, y_val = X_val.astype(dtype, copy=False), y_val.astype(dtype, copy=False)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, X_val=X_val, y_val=y_val)
+    tmp_path.replace(cache_path)
+    return key, X_val, y_val
+
+
+def normalized_split(key, X_val, mean, std):
+    """X_val normalized with (mean, std), shared by every model trained with the same statistics."""
+    norm_key = (key, mean.dtype.name, mean.tobytes(), std.tobytes())
+    if norm_key not in _normalized:
+        _normalized[norm_key] = normalize_apply(X_val, mean, std)
+    return _normalized[norm_key]
 
-    X, y = load_data(DATA_PATH)
-    X_tr, y_tr, X_val, y_val = train_val_split(X, y, val_ratio=0.2, seed=42)
-    params, mean, std, feature_cols = load_saved_model(MODEL_PATH)
-    if feature_cols:
-        print(f"Loaded model with {len(feature_cols)} features from: {MODEL_PATH}")
-    X_tr = normalize_apply(X_tr, mean, std)
-    X_val = normalize_apply(X_val, mean, std)
 
-    y_val_hat, _ = forward(X_val, params)
-    val_loss = compute_loss(y_val_hat, y_val)
+def parse_args():
+    parser = build_parser()
+    parser.add_argument("--model", type=Path, nargs="+", default=[MODEL_PATH],
+                        help="one or more saved models, all scored on the same validation rows")
+    args = parser.parse_args()
+    check_out_of_core(parser, args)
+    return args
 
-    y_pred = predict(X_val, params, threshold=0.5)
+
+def report(val_loss, y_val, y_pred):
     tp, tn, fp, fn = confusion_counts(y_val, y_pred)
     acc, precision, recall, f1 = metrics_from_counts(tp, tn, fp, fn)
 
@@ -76,5 +97,35 @@ def main():
     print(f"FN={fn}  TP={tp}")
 
 
+def main():
+    args = parse_args()
+    missing = [p for p in args.model if not p.exists()]
+    if missing:
+        print(f"Model file not found: {missing[0]}")
+        print("Run `python ml/train.py` first.")
+        return
+
+    dtype = DTYPES[args.dtype]
+    if args.out_of_core:
+        X, y = load_data(args.data, dtype)
+    else:
+        key, X_val, y_val = validation_split(args.data, dtype)
+
+    for i, path in enumerate(args.model):
+        model = load_model(path)
+        params, mean, std = model.cast(dtype)
+        if i:
+            print()
+        print(f"Loaded model with {len(model.feature_cols)} features from: {path}")
+
+        if args.out_of_core:
+            val_loss, y_val, y_pred = evaluate_streaming(X, y, params, mean, std, "val", args.block_rows)
+        else:
+            y_val_hat, _ = forward(normalized_split(key, X_val, mean, std), params)
+            val_loss = compute_loss(y_val_hat, y_val)
+            y_pred = (y_val_hat >= 0.5).astype(np.int32)
+        report(val_loss, y_val, y_pred)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
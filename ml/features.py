@@ -1,11 +1,18 @@
 import math
 
+import numpy as np
+
+from sim.traffic import nearest_gaps
+
 TWO_PI = 2 * math.pi
 FEATURE_NAMES = [
     "tire_wear", "laps_since_pit", "recent_pace_drop", "gap_ahead", "gap_behind",
     "traffic_density", "is_stuck", "lap_norm", "safety_car_active"
 ]
 
+# columns that extract() returns as ints (kept as ints when rows are written out)
+INT_FEATURES = ("laps_since_pit", "is_stuck", "safety_car_active")
+
 GAP_ANGLE_WINDOW = 0.5
 STUCK_THRESHOLD_SEC = 2.0
 PACE_DROP_CLIP = 0.3
@@ -38,14 +45,12 @@ def extract(car, all_cars, safety_car_active, total_laps):
     # gap_ahead, gap_behind: nearest car ahead/behind in angle, converted to seconds
     gap_ahead = 30.0
     gap_behind = 30.0
-    for other in all_cars:
-        if other is car or other.in_pit:
-            continue
-        diff = (other.angle - car.angle) % TWO_PI
-        if 0 < diff < TWO_PI / 2:
-            gap_ahead = min(gap_ahead, gap_to_seconds(diff, car))
-        if 0 < (TWO_PI - diff) < TWO_PI / 2:
-            gap_behind = min(gap_behind, gap_to_seconds(TWO_PI - diff, car))
+    ahead, behind = nearest_gaps(
+        car.angle, [other.angle for other in all_cars if other is not car and not other.in_pit])
+    if ahead is not None and ahead < TWO_PI / 2:
+        gap_ahead = min(gap_ahead, gap_to_seconds(ahead, car))
+    if behind is not None and 0 < behind < TWO_PI / 2:
+        gap_behind = min(gap_behind, gap_to_seconds(behind, car))
 
     traffic_density = 1.0 - car.traffic_factor
     traffic_density = min(1.0, max(0.0, traffic_density))
@@ -70,3 +75,110 @@ def extract(car, all_cars, safety_car_active, total_laps):
     }
     row = [d[k] for k in FEATURE_NAMES]
     return d, row
+
+
+# per-lap simulator state that extract_inputs() needs, as gathered by lap_inputs()
+LAP_INPUTS = (
+    "slot", "tire_wear", "laps_since_pit", "lap_speeds", "lap_speed_count", "base_speed", "traffic_factor",
+    "sc_factor", "field_angle", "field_in_pit", "seconds_in_traffic", "lap_count", "safety_car_active",
+)
+
+
+def lap_inputs(state, races, slots):
+    """The raw state behind the features of the cars at (races[k], slots[k]) of a RaceState.
+
+    A dict of LAP_INPUTS arrays with one row per car: its own per-car values,
+    plus the angles and pit flags of its whole field (``field_angle[k, slot[k]]``
+    is the car's own angle). Nothing here depends on how features are
+    computed, so these rows can be stored and featurized again later.
+    """
+    races = np.asarray(races, dtype=np.intp)
+    slots = np.asarray(slots, dtype=np.intp)
+    return {
+        "slot": slots,
+        "tire_wear": state.tire_wear[races, slots],
+        "laps_since_pit": state.laps_since_pit[races, slots],
+        "lap_speeds": state.lap_speeds[races, slots],
+        "lap_speed_count": state.lap_speed_count[races, slots],
+        "base_speed": state.base_speed[races, slots],
+        "traffic_factor": state.traffic_factor[races, slots],
+        "sc_factor": state.sc_factor[races],
+        "field_angle": state.angle[races],
+        "field_in_pit": state.in_pit[races],
+        "seconds_in_traffic": state.seconds_in_traffic[races, slots],
+        "lap_count": state.lap_count[races, slots],
+        "safety_car_active": state.safety_car_active[races],
+    }
+
+
+def extract_batch(state, races, slots, total_laps):
+    """Vectorized extract() for the cars at (races[k], slots[k]) of a RaceState.
+
+    *state* is a RaceState (or anything with the same (n_races, n_cars) arrays).
+    Returns an (m, 9) float64 matrix in FEATURE_NAMES order whose values are
+    identical to the rows extract() produces for the same cars.
+    """
+    return extract_inputs(lap_inputs(state, races, slots), total_laps)
+
+
+def extract_inputs(inputs, total_laps):
+    """extract_batch() on rows already gathered by lap_inputs() (or loaded from a lap cache)."""
+    slots = np.asarray(inputs["slot"], dtype=np.intp)
+    m = len(slots)
+    X = np.empty((m, len(FEATURE_NAMES)))
+    if m == 0:
+        return X
+
+    wear = inputs["tire_wear"]
+    traffic = inputs["traffic_factor"]
+    X[:, 0] = np.clip(wear, 0.0, 1.0)
+    X[:, 1] = np.clip(inputs["laps_since_pit"], 0, 50)
+
+    # recent_pace_drop over the (up to 4) recorded lap speeds
+    speeds = inputs["lap_speeds"]
+    count = inputs["lap_speed_count"]
+    valid = np.arange(speeds.shape[1]) >= speeds.shape[1] - count[:, np.newaxis]
+    hi = np.where(valid, speeds, -np.inf).max(axis=1)
+    lo = np.where(valid, speeds, np.inf).min(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drop = np.where(hi > 0, (hi - lo) / hi, 0.0)
+    X[:, 2] = np.where(count >= 2, np.minimum(PACE_DROP_CLIP, np.maximum(0.0, drop)), 0.0)
+
+    # gap_ahead / gap_behind: nearest other car on track, forward and backward
+    w = inputs["base_speed"] * (1 - 0.30 * wear) * traffic * inputs["sc_factor"]
+    field = inputs["field_angle"]
+    visible = ~inputs["field_in_pit"]
+    visible[np.arange(m), slots] = False
+    diff = (field - field[np.arange(m), slots][:, np.newaxis]) % TWO_PI
+    candidate = visible & (diff > 0)
+    ahead = np.where(candidate, diff, np.inf).min(axis=1)
+    behind = TWO_PI - np.where(candidate, diff, -np.inf).max(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        X[:, 3] = np.where(ahead < TWO_PI / 2, _gap_to_seconds(ahead, w), 30.0)
+        X[:, 4] = np.where((behind > 0) & (behind < TWO_PI / 2), _gap_to_seconds(behind, w), 30.0)
+
+    X[:, 5] = np.clip(1.0 - traffic, 0.0, 1.0)
+    X[:, 6] = inputs["seconds_in_traffic"] >= STUCK_THRESHOLD_SEC
+    if total_laps > 0:
+        X[:, 7] = np.clip(inputs["lap_count"] / total_laps, 0.0, 1.0)
+    else:
+        X[:, 7] = 0.0
+    X[:, 8] = inputs["safety_car_active"]
+    return X
+
+
+def _gap_to_seconds(angle_gap, w):
+    return np.where(w <= 0, 30.0, np.minimum(30.0, np.maximum(0.0, angle_gap / w)))
+
+
+def batch_rows(X, labels=None):
+    """Turn an extract_batch() matrix into CSV rows shaped like extract()'s (ints stay ints)."""
+    int_cols = [FEATURE_NAMES.index(k) for k in INT_FEATURES]
+    rows = X.tolist()
+    for row in rows:
+        for j in int_cols:
+            row[j] = int(row[j])
+    if labels is not None:
+        for row, lab in zip(rows, labels.tolist()):
+            row.append(lab)
+    return rows
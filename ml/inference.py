@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+
+
+class Predictor:
+    """Inference-only form of the 9→16→8→1 network.
+
+    Input normalization is folded into the first layer, no backprop cache is
+    built, and activations go into buffers that are reused between calls, so
+    per-call overhead stays small when the network is queried row by row.
+
+    Inference runs in *dtype*, by default the dtype of the weights (so a model
+    trained with ``--dtype float32`` is served in float32). Build one for a
+    saved model with ``ml.registry.load_model(path).predictor()``, which
+    validates the file and caches the result.
+    """
+
+    def __init__(self, params, mean, std, batch_capacity=64, dtype=None):
+        self.dtype = np.dtype(dtype if dtype is not None else params["W1"].dtype)
+        mean = np.asarray(mean, dtype=np.float64).reshape(1, -1)
+        std = np.asarray(std, dtype=np.float64).reshape(1, -1)
+        W1, b1 = params["W1"].astype(np.float64), params["b1"].astype(np.float64)
+        # ((x - mean) / std) @ W1 + b1  ==  x @ (W1 / std.T) + (b1 - (mean / std) @ W1), folded in float64
+        self.W1 = (W1 / std.T).astype(self.dtype)
+        self.b1 = (b1 - (mean / std) @ W1).astype(self.dtype)
+        self.W2, self.b2 = params["W2"].astype(self.dtype), params["b2"].astype(self.dtype)
+        self.W3, self.b3 = params["W3"].astype(self.dtype), params["b3"].astype(self.dtype)
+        self.n_features = self.W1.shape[0]
+        self._alloc(batch_capacity)
+
+        # single-row path: biases appended as an extra weight row, fed by a constant 1
+        self._W1a = np.vstack([self.W1, self.b1])
+        self._W2a = np.vstack([self.W2, self.b2])
+        self._W3a = np.vstack([self.W3, self.b3]).ravel()
+        self._x1 = np.ones(self.n_features + 1, dtype=self.dtype)
+        self._a1 = np.ones(self.W1.shape[1] + 1, dtype=self.dtype)
+        self._a2 = np.ones(self.W2.shape[1] + 1, dtype=self.dtype)
+
+    def _alloc(self, capacity):
+        self._capacity = capacity
+        self._h1 = np.empty((capacity, self.W1.shape[1]), dtype=self.dtype)
+        self._h2 = np.empty((capacity, self.W2.shape[1]), dtype=self.dtype)
+        self._out = np.empty((capacity, 1), dtype=self.dtype)
+
+    def _forward(self, X):
+        m = X.shape[0]
+        if m > self._capacity:
+            self._alloc(max(m, 2 * self._capacity))
+        h1, h2, out = self._h1[:m], self._h2[:m], self._out[:m]
+
+        np.dot(X, self.W1, out=h1)
+        h1 += self.b1
+        np.maximum(h1, 0.0, out=h1)
+        np.dot(h1, self.W2, out=h2)
+        h2 += self.b2
+        np.maximum(h2, 0.0, out=h2)
+        np.dot(h2, self.W3, out=out)
+        out += self.b3
+
+        # sigmoid, clipped like nn_numpy.sigmoid
+        np.clip(out, -50, 50, out=out)
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        out += 1.0
+        np.reciprocal(out, out=out)
+        return out
+
+    def predict_proba(self, X):
+        """Pit probabilities (m, 1) for a batch of raw (unnormalized) feature rows."""
+        X = np.asarray(X, dtype=self.dtype).reshape(-1, self.n_features)
+        return self._forward(X).copy()
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X) >= threshold).astype(np.int32)
+
+    def predict_row(self, row):
+        """Pit probability for one raw feature row (e.g. the list from features.extract)."""
+        x, a1, a2 = self._x1, self._a1, self._a2
+        x[:-1] = row
+        np.dot(x, self._W1a, out=a1[:-1])
+        np.maximum(a1, 0.0, out=a1)
+        np.dot(a1, self._W2a, out=a2[:-1])
+        np.maximum(a2, 0.0, out=a2)
+        z = min(50.0, max(-50.0, float(a2 @ self._W3a)))
+        return 1.0 / (1.0 + math.exp(-z))
+
+
+def apply_pit_recommendations(state, races, slots, proba, threshold=0.5):
+    """Flag ``wants_pit`` in a RaceState for every (race, slot) the network says should pit.
+
+    *races*, *slots* and *proba* are parallel arrays, one entry per lap completion.
+    Cars already in the pit lane are left alone.
+    """
+    pit = np.asarray(proba).reshape(-1) >= threshold
+    races, slots = np.asarray(races)[pit], np.asarray(slots)[pit]
+    on_track = ~state.in_pit[races, slots]
+    state.wants_pit[races[on_track], slots[on_track]] = True
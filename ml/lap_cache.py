@@ -0,0 +1,166 @@
+import ast
+import hashlib
+import inspect
+import json
+import textwrap
+from pathlib import Path
+
+import numpy as np
+
+from ml import features, oracle
+from ml.features import LAP_INPUTS, extract_inputs
+from ml.oracle import label_batch
+from sim import car, event_race, race, traffic
+
+ROOT = Path(__file__).resolve().parent.parent
+LAP_CACHE_DIR = ROOT / "data" / "cache" / "laps"
+CACHE_CHUNK = 1000      # races per cache file; files start at multiples of this whatever the run's size
+VERSION_LENGTH = 12     # hex digits of sha256 kept in directory and file names
+
+# narrower on-disk types for the integer inputs (exact for the values a race can reach)
+STORED_DTYPES = {"race": np.int64, "slot": np.int8, "laps_since_pit": np.int16, "lap_speed_count": np.int8,
+                 "lap_count": np.int16}
+
+
+def code_text(obj):
+    """Source of *obj* (a module or function) without comments, docstrings or formatting.
+
+    The source is parsed and unparsed, so only edits that change the code
+    itself change the text.
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(obj)))
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            first = node.body[0]
+            if isinstance(first, ast.Expr) and isinstance(getattr(first.value, "value", None), str):
+                node.body = node.body[1:] or [ast.Pass()]
+    return ast.unparse(tree)
+
+
+def source_version(*objects, params=None):
+    """Short sha256 of the :func:`code_text` of *objects* (modules or functions) and the JSON of *params*."""
+    h = hashlib.sha256()
+    for obj in objects:
+        h.update(code_text(obj).encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()[:VERSION_LENGTH]
+
+
+def physics_version(engine, code=(), params=None):
+    """Version of the simulate stage: the simulator modules, what is recorded per lap, and run settings.
+
+    *code* adds the caller's own functions that shape the races (track, styles,
+    seeding, the stepping loop); *params* its constants.
+    """
+    modules = [car, traffic, race] + ([event_race] if engine == "event" else [])
+    return source_version(*modules, features.lap_inputs, *code, params={"engine": engine, **(params or {})})
+
+
+def feature_version(total_laps):
+    return source_version(features, params={"total_laps": total_laps})
+
+
+def oracle_version():
+    return source_version(oracle)
+
+
+def concat_laps(parts, offset=0):
+    """Merge ``(races, lap_inputs)`` pairs recorded step by step into one table in dataset row order.
+
+    Rows are sorted by race (``race`` = local index + *offset*); within a race
+    they stay in the order they were recorded.
+    """
+    races = np.concatenate([p[0] for p in parts]) if parts else np.empty(0, dtype=np.intp)
+    order = np.argsort(races, kind="stable")
+    laps = {"race": races[order] + offset}
+    for name in LAP_INPUTS:
+        laps[name] = np.concatenate([p[1][name] for p in parts])[order] if parts else np.empty(0)
+    return laps
+
+
+class LapCache:
+    """Stage files of one simulator version, one set per chunk of races.
+
+    Under ``<root>/<physics version>/``:
+
+    - ``laps_<start>_<stop>.npz``: the LAP_INPUTS rows (and ``race``) of races start..stop-1
+    - ``X_<features>_<start>_<stop>.npy``: their feature matrix
+    - ``y_<features>-<oracle>_<start>_<stop>.npy``: their labels
+
+    Races are independent, so a chunk cached for fewer races than a run needs
+    is extended with just the missing ones (:meth:`extend_laps`), and a run
+    that needs fewer uses a prefix of the file (:meth:`rows`).
+    :meth:`rows` computes only the stages whose version has no file yet, so
+    after an oracle change every chunk is relabeled from its cached features,
+    and after a feature change refeaturized from its cached laps, without
+    simulating anything. Old versions stay until the directory is deleted.
+    """
+
+    def __init__(self, physics, features, oracle, total_laps, root=LAP_CACHE_DIR):
+        self.dir = Path(root) / physics
+        self.features = features
+        self.oracle = oracle
+        self.total_laps = total_laps
+        self.computed = {"races simulated": 0, "chunks featurized": 0, "chunks labeled": 0}
+
+    def _path(self, stage, start, stop, suffix):
+        return self.dir / f"{stage}_{start:08d}_{stop:08d}{suffix}"
+
+    def cached_stop(self, start):
+        """One past the last race cached for the chunk starting at *start* (*start* if none is)."""
+        return max((int(p.stem.split("_")[2]) for p in self.dir.glob(f"laps_{start:08d}_*.npz")), default=start)
+
+    def extend_laps(self, start, cached, stop, laps):
+        """Save races ``cached..stop-1`` (*laps*) after the ones cached for the chunk at *start*.
+
+        The chunk's files for ``start..cached-1`` are replaced by one for
+        ``start..stop-1``; features and labels are recomputed for it on the next :meth:`rows`.
+        """
+        self.computed["races simulated"] += stop - cached
+        if cached > start:
+            laps = {k: np.concatenate([v, laps[k]]) for k, v in self.load_laps(start, cached).items()}
+        arrays = {k: v.astype(STORED_DTYPES[k]) if k in STORED_DTYPES else v for k, v in laps.items()}
+        self._save(self._path("laps", start, stop, ".npz"), lambda f: np.savez_compressed(f, **arrays))
+        if cached > start:
+            for path in self.dir.glob(f"*_{start:08d}_{cached:08d}.np[yz]"):
+                path.unlink()
+
+    def load_laps(self, start, stop, names=("race",) + LAP_INPUTS):
+        with np.load(self._path("laps", start, stop, ".npz"), allow_pickle=False) as data:
+            return {k: data[k] for k in names}
+
+    def rows(self, start, stop):
+        """``(race, X, y)`` for races start..stop-1, which must be cached in the chunk at *start*."""
+        cached = self.cached_stop(start)
+        if cached < stop:
+            raise ValueError(f"races {cached}..{stop - 1} are not in the lap cache {self.dir}")
+        race_index, X, y = self._chunk_rows(start, cached)
+        n = int(np.searchsorted(race_index, stop))
+        return race_index[:n], X[:n], y[:n]
+
+    def _chunk_rows(self, start, stop):
+        race_index = self.load_laps(start, stop, ("race",))["race"]
+
+        X_path = self._path(f"X_{self.features}", start, stop, ".npy")
+        if X_path.exists():
+            X = np.load(X_path)
+        else:
+            X = extract_inputs(self.load_laps(start, stop, LAP_INPUTS), self.total_laps)
+            self._save(X_path, lambda f: np.save(f, X))
+            self.computed["chunks featurized"] += 1
+
+        y_path = self._path(f"y_{self.features}-{self.oracle}", start, stop, ".npy")
+        if y_path.exists():
+            y = np.load(y_path)
+        else:
+            y = label_batch(X).astype(np.uint8)
+            self._save(y_path, lambda f: np.save(f, y))
+            self.computed["chunks labeled"] += 1
+        return race_index, X, y
+
+    def _save(self, path, write):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            write(f)
+        tmp.replace(path)
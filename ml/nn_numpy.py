@@ -1,6 +1,10 @@
+import math
+
 import numpy as np
 
-def init_params(n_x=9, n_h1=16, n_h2=8, seed=42):
+PARAM_KEYS = ("W1", "b1", "W2", "b2", "W3", "b3")
+
+def init_params(n_x=9, n_h1=16, n_h2=8, seed=42, dtype=np.float64):
     rng = np.random.default_rng(seed)
 
     W1 = rng.standard_normal((n_x, n_h1)) * np.sqrt(2.0 / n_x)
@@ -13,7 +17,9 @@ def init_params(n_x=9, n_h1=16, n_h2=8, seed=42):
     W3 = rng.standard_normal((n_h2, 1)) * np.sqrt(2.0 / n_h2)
     b3 = np.zeros((1, 1))
 
-    return {"W1": W1, "b1": b1, "W2": W2, "b2": b2, "W3": W3, "b3": b3}
+    params = {"W1": W1, "b1": b1, "W2": W2, "b2": b2, "W3": W3, "b3": b3}
+    # drawn in float64 either way, so both dtypes start from the same weights
+    return {k: v.astype(dtype, copy=False) for k, v in params.items()}
 
 
 def relu(x):
@@ -21,7 +27,7 @@ def relu(x):
 
 
 def relu_grad(x):
-    return (x > 0).astype(np.float64)
+    return (x > 0).astype(x.dtype)
 
 
 def sigmoid(x):
@@ -48,7 +54,7 @@ def forward(X, params):
 
 
 def compute_loss(y_hat, y):
-    eps = 1e-8
+    eps = max(1e-8, float(np.finfo(y_hat.dtype).eps))  # 1 - 1e-8 rounds to 1 in float32
     y_hat = np.clip(y_hat, eps, 1.0 - eps)  # limit overflow
     loss = -np.mean(y * np.log(y_hat) + (1.0 - y) * np.log(1.0 - y_hat))
     return loss
@@ -91,16 +97,266 @@ def backward(params, cache, y):
     return grads
 
 
-def update_params(params, grads, lr=0.01):
-    params["W1"] -= lr * grads["dW1"]
-    params["b1"] -= lr * grads["db1"]
-    params["W2"] -= lr * grads["dW2"]
-    params["b2"] -= lr * grads["db2"]
-    params["W3"] -= lr * grads["dW3"]
-    params["b3"] -= lr * grads["db3"]
+def update_params(params, grads, lr=0.01, scratch=None):
+    """params -= lr * grads, in place. With *scratch* (arrays shaped like params) nothing is allocated."""
+    if scratch is None:
+        scratch = dict.fromkeys(params)
+    for k in params:
+        step = np.multiply(grads["d" + k], lr, out=scratch[k])
+        np.subtract(params[k], step, out=params[k])
     return params
 
 
+class Network:
+    """Training-mode 9→16→8→1 network with preallocated workspaces.
+
+    Each layer's bias is stored as the last row of an augmented weight matrix
+    and every activation buffer ends in a constant column of ones, so a layer
+    is one ``np.dot`` and its weight and bias gradients come out of one
+    ``np.dot`` too. The augmented matrices are consecutive slices of one flat
+    vector ``theta`` (in flatten_params order), and their gradients of ``grad``;
+    ``params`` and ``grads`` are views with the usual keys and shapes.
+
+    :meth:`step` hands ``theta`` and ``grad`` to an optimizer as single arrays,
+    so an update is a handful of ufunc calls. The activation buffers are sized
+    for *batch_size* rows (smaller batches use the leading rows), so a
+    training step allocates nothing. ``forward`` and ``backward`` agree with
+    the module-level functions up to rounding.
+    """
+
+    def __init__(self, params, batch_size):
+        self.dtype = params["W1"].dtype
+        self.sizes = [params["W1"].shape[0], params["W1"].shape[1], params["W2"].shape[1], 1]
+        self.theta = flatten_params(params).astype(self.dtype)
+        self.grad = np.zeros_like(self.theta)
+        self._W, self._dW = [], []
+        self.params, self.grads = {}, {}
+        offset = 0
+        for layer, (n_in, n_out) in enumerate(zip(self.sizes[:-1], self.sizes[1:]), start=1):
+            size = (n_in + 1) * n_out
+            Wa = self.theta[offset:offset + size].reshape(n_in + 1, n_out)
+            dWa = self.grad[offset:offset + size].reshape(n_in + 1, n_out)
+            offset += size
+            self._W.append(Wa)
+            self._dW.append(dWa)
+            self.params[f"W{layer}"], self.params[f"b{layer}"] = Wa[:-1], Wa[-1:]
+            self.grads[f"dW{layer}"], self.grads[f"db{layer}"] = dWa[:-1], dWa[-1:]
+        self._m = 0
+        self._alloc(batch_size)
+
+    def _alloc(self, capacity):
+        n_x, n_h1, n_h2, _ = self.sizes
+        self.capacity = capacity
+        # inputs of each layer, with the ones column that multiplies the bias row
+        self._in = [np.ones((capacity, n + 1), dtype=self.dtype) for n in (n_x, n_h1, n_h2)]
+        self._Z1, self._dZ1 = (np.empty((capacity, n_h1), dtype=self.dtype) for _ in range(2))
+        self._Z2, self._dZ2 = (np.empty((capacity, n_h2), dtype=self.dtype) for _ in range(2))
+        self._mask1 = np.empty((capacity, n_h1), dtype=bool)
+        self._mask2 = np.empty((capacity, n_h2), dtype=bool)
+        self._y_hat = np.empty((capacity, 1), dtype=self.dtype)
+        self._dZ3 = np.empty((capacity, 1), dtype=self.dtype)
+
+    def forward(self, X):
+        """Return y_hat (a view into a workspace, overwritten by the next call)."""
+        m = X.shape[0]
+        if m > self.capacity:
+            self._alloc(m)
+        self._m = m
+        X1, A1, A2 = (a[:m] for a in self._in)
+        W1, W2, W3 = self._W
+        Z1, Z2, y_hat = self._Z1[:m], self._Z2[:m], self._y_hat[:m]
+
+        X1[:, :-1] = X
+        np.dot(X1, W1, out=Z1)
+        np.maximum(Z1, 0.0, out=A1[:, :-1])
+        np.dot(A1, W2, out=Z2)
+        np.maximum(Z2, 0.0, out=A2[:, :-1])
+        np.dot(A2, W3, out=y_hat)
+
+        # sigmoid, clipped like sigmoid()
+        np.clip(y_hat, -50, 50, out=y_hat)
+        np.negative(y_hat, out=y_hat)
+        np.exp(y_hat, out=y_hat)
+        y_hat += 1.0
+        np.divide(1.0, y_hat, out=y_hat)
+        return y_hat
+
+    def backward(self, y):
+        """Gradients of the mean cross-entropy for the batch of the last ``forward``."""
+        m = self._m
+        X1, A1, A2 = (a[:m] for a in self._in)
+        W1, W2, W3 = self._W
+        dW1, dW2, dW3 = self._dW
+        dZ1, dZ2, dZ3 = self._dZ1[:m], self._dZ2[:m], self._dZ3[:m]
+        mask1, mask2 = self._mask1[:m], self._mask2[:m]
+
+        # the 1/m of the mean is applied once, here, and carries through every layer
+        np.subtract(self._y_hat[:m], y, out=dZ3)
+        dZ3 /= m
+        np.dot(A2.T, dZ3, out=dW3)
+
+        np.dot(dZ3, W3[:-1].T, out=dZ2)
+        np.greater(self._Z2[:m], 0, out=mask2)
+        dZ2 *= mask2
+        np.dot(A1.T, dZ2, out=dW2)
+
+        np.dot(dZ2, W2[:-1].T, out=dZ1)
+        np.greater(self._Z1[:m], 0, out=mask1)
+        dZ1 *= mask1
+        np.dot(X1.T, dZ1, out=dW1)
+        return self.grads
+
+    def loss_and_grads(self, X, y):
+        return compute_loss(self.forward(X), y), self.backward(y)
+
+    def step(self, optimizer):
+        """Apply one optimizer update to ``theta`` from ``grad`` (as computed by the last ``backward``)."""
+        optimizer.step({"theta": self.theta}, {"dtheta": self.grad})
+
+
+# ---- optimizers -------------------------------------------------------------
+# Each optimizer's step(params, grads) updates params in place and returns them,
+# like update_params, for every key k of params (its gradient is grads["d" + k]).
+# Per-parameter state is created on the first step.
+
+class SGD:
+    def __init__(self, lr=0.01):
+        self.lr = lr
+        self.scratch = None
+
+    def step(self, params, grads):
+        if self.scratch is None:
+            self.scratch = {k: np.empty_like(params[k]) for k in params}
+        return update_params(params, grads, lr=self.lr, scratch=self.scratch)
+
+
+class Momentum:
+    """SGD with heavy-ball momentum: v = beta*v + g; w -= lr*v."""
+
+    def __init__(self, lr=0.01, beta=0.9):
+        self.lr = lr
+        self.beta = beta
+        self.velocity = None
+        self.scratch = None
+
+    def step(self, params, grads):
+        if self.velocity is None:
+            self.velocity = {k: np.zeros_like(params[k]) for k in params}
+            self.scratch = {k: np.empty_like(params[k]) for k in params}
+        for k in params:
+            v = self.velocity[k]
+            v *= self.beta
+            v += grads["d" + k]
+            step = np.multiply(v, self.lr, out=self.scratch[k])
+            params[k] -= step
+        return params
+
+
+class Adam:
+    """Adam (Kingma & Ba) with bias-corrected first and second moment estimates."""
+
+    def __init__(self, lr=0.001, beta1=0.9, beta2=0.999, eps=1e-8):
+        self.lr = lr
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.t = 0
+        self.m = self.v = self.scratch = None
+
+    def step(self, params, grads):
+        if self.m is None:
+            self.m = {k: np.zeros_like(params[k]) for k in params}
+            self.v = {k: np.zeros_like(params[k]) for k in params}
+            self.scratch = {k: (np.empty_like(params[k]), np.empty_like(params[k])) for k in params}
+        self.t += 1
+        lr_t = self.lr * math.sqrt(1.0 - self.beta2 ** self.t) / (1.0 - self.beta1 ** self.t)
+        for k in params:
+            g = grads["d" + k]
+            m, v = self.m[k], self.v[k]
+            a, b = self.scratch[k]
+            m *= self.beta1
+            np.multiply(g, 1.0 - self.beta1, out=a)
+            m += a
+            v *= self.beta2
+            np.multiply(g, g, out=a)
+            a *= 1.0 - self.beta2
+            v += a
+            # params -= lr_t * m / (sqrt(v) + eps)
+            np.sqrt(v, out=b)
+            b += self.eps
+            np.divide(m, b, out=a)
+            a *= lr_t
+            params[k] -= a
+        return params
+
+
+OPTIMIZERS = {"sgd": SGD, "momentum": Momentum, "adam": Adam}
+
+
+# ---- full-batch L-BFGS over the flattened parameter vector ------------------
+
+def flatten_params(params):
+    return np.concatenate([params[k].ravel() for k in PARAM_KEYS])
+
+
+def lbfgs(fun, theta, max_iter=500, history=10, tol=1e-6, ftol=1e-12, callback=None):
+    """Minimize ``fun(theta) -> (loss, grad)`` with L-BFGS and a backtracking (Armijo) line search.
+
+    Stops when the largest gradient entry drops below *tol* or an iteration
+    improves the loss by less than *ftol* (relative). *callback(iteration, theta,
+    loss)* runs after every iteration; returning True stops early. Returns the
+    final parameter vector.
+    """
+    theta = theta.copy()
+    loss, grad = fun(theta)
+    s_hist, y_hist, rho_hist = [], [], []
+
+    for it in range(1, max_iter + 1):
+        # two-loop recursion: direction = -H * grad
+        q = grad.copy()
+        alphas = []
+        for s, yv, rho in zip(reversed(s_hist), reversed(y_hist), reversed(rho_hist)):
+            a = rho * s.dot(q)
+            q -= a * yv
+            alphas.append(a)
+        if s_hist:
+            q *= s_hist[-1].dot(y_hist[-1]) / y_hist[-1].dot(y_hist[-1])
+        for s, yv, rho, a in zip(s_hist, y_hist, rho_hist, reversed(alphas)):
+            q += (a - rho * yv.dot(q)) * s
+        direction = -q
+        slope = grad.dot(direction)
+        if slope >= 0:  # not a descent direction: restart from steepest descent
+            s_hist, y_hist, rho_hist = [], [], []
+            direction, slope = -grad, -grad.dot(grad)
+
+        step = 1.0 if s_hist else min(1.0, 1.0 / max(np.abs(grad).sum(), 1e-12))
+        while True:
+            new_theta = theta + step * direction
+            new_loss, new_grad = fun(new_theta)
+            if new_loss <= loss + 1e-4 * step * slope or step < 1e-10:
+                break
+            step *= 0.5
+
+        s, yv = new_theta - theta, new_grad - grad
+        sy = s.dot(yv)
+        if sy > 1e-10:  # keep the curvature pair only if it keeps H positive definite
+            s_hist.append(s)
+            y_hist.append(yv)
+            rho_hist.append(1.0 / sy)
+            if len(s_hist) > history:
+                s_hist.pop(0)
+                y_hist.pop(0)
+                rho_hist.pop(0)
+
+        improvement = loss - new_loss
+        theta, loss, grad = new_theta, new_loss, new_grad
+        if callback is not None and callback(it, theta, loss):
+            break
+        if np.abs(grad).max() < tol or improvement <= ftol * max(1.0, abs(loss)):
+            break
+    return theta
+
+
 def predict_proba(X, params):
     y_hat, _ = forward(X, params)
     return y_hat
@@ -1,3 +1,8 @@
+import numpy as np
+
+from ml.features import FEATURE_NAMES
+
+
 def label(features):
 
     tw = features.get("tire_wear", 0.0)
@@ -15,3 +20,16 @@ def label(features):
     if tw > 0.70:
         return 1
     return 0
+
+
+def label_batch(X):
+    """Vectorized label() over an (m, 9) feature matrix in FEATURE_NAMES order."""
+    tw, pace, density, gap_ahead, safety = (X[:, FEATURE_NAMES.index(k)] for k in (
+        "tire_wear", "recent_pace_drop", "traffic_density", "gap_ahead", "safety_car_active"))
+    pit = (
+        ((safety != 0) & (tw > 0.35))
+        | ((tw > 0.55) & (pace > 0.08))
+        | ((tw > 0.45) & (density > 0.07) & (gap_ahead < 10))
+        | (tw > 0.70)
+    )
+    return pit.astype(np.int64)
@@ -0,0 +1,91 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES
+from ml.inference import Predictor
+from ml.nn_numpy import PARAM_KEYS
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT / "models" / "nn_model.npz"
+HASH_CHUNK = 1 << 20
+
+_models = {}  # sha256 of the .npz -> Model
+
+
+def file_hash(*paths):
+    """sha256 over the contents of *paths*, read in order."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class Model:
+    """A validated model artifact as saved by ``train.save_model``.
+
+    Instances are shared: :func:`load_model` returns the same object for
+    every file with the same contents, so treat the arrays as read-only.
+    """
+
+    def __init__(self, path, digest, params, mean, std, feature_cols):
+        self.path = path
+        self.digest = digest
+        self.params = params
+        self.mean = mean
+        self.std = std
+        self.feature_cols = feature_cols
+        self._predictors = {}
+
+    @property
+    def dtype(self):
+        return self.params["W1"].dtype
+
+    def cast(self, dtype):
+        """(params, mean, std) in *dtype*; no copies when the model already is."""
+        params = {k: v.astype(dtype, copy=False) for k, v in self.params.items()}
+        return params, self.mean.astype(dtype, copy=False), self.std.astype(dtype, copy=False)
+
+    def predictor(self, batch_capacity=64, dtype=None):
+        """The normalization-folded :class:`Predictor`, built once per (capacity, dtype)."""
+        key = (batch_capacity, np.dtype(dtype if dtype is not None else self.dtype))
+        if key not in self._predictors:
+            self._predictors[key] = Predictor(self.params, self.mean, self.std, batch_capacity, key[1])
+        return self._predictors[key]
+
+
+def _read_model(path, digest, feature_names):
+    with np.load(path, allow_pickle=False) as data:
+        missing = [k for k in PARAM_KEYS + ("mean", "std", "feature_cols") if k not in data.files]
+        if missing:
+            raise ValueError(f"{path} is not a saved model: missing {', '.join(missing)}")
+        params = {k: data[k] for k in PARAM_KEYS}
+        mean, std = data["mean"], data["std"]
+        feature_cols = data["feature_cols"].tolist()
+
+    if feature_cols != list(feature_names):
+        raise ValueError(f"{path} was trained on features {feature_cols}, expected {list(feature_names)}")
+    n = len(feature_cols)
+    if params["W1"].shape[0] != n or mean.size != n or std.size != n:
+        raise ValueError(f"{path}: W1 {params['W1'].shape}, mean {mean.shape} and std {std.shape} "
+                         f"do not match {n} features")
+    return Model(path, digest, params, mean, std, feature_cols)
+
+
+def load_model(path=MODEL_PATH, feature_names=FEATURE_NAMES):
+    """Load and validate a saved model, or return the cached copy of an identical file.
+
+    The cache key is the file's sha256, so a retrained model at the same
+    path is picked up, and the same weights saved under several names are
+    parsed once. Raises ValueError if the artifact is incomplete or was
+    trained on other features than *feature_names*.
+    """
+    path = Path(path)
+    digest = file_hash(path)
+    model = _models.get(digest)
+    if model is None:
+        model = _models[digest] = _read_model(path, digest, feature_names)
+    return model
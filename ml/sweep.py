@@ -0,0 +1,205 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+RESULTS_PATH = ROOT / "data" / "sweep_results.csv"
+BEST_MODEL_PATH = ROOT / "models" / "sweep_best.npz"
+
+# grid searched when no axis is overridden on the command line
+SEARCH_SPACE = {
+    "optimizer": ["adam"],
+    "lr": [0.003, 0.01],
+    "batch_size": [1024],
+    "n_h1": [8, 16, 32],
+    "n_h2": [8, 16],
+}
+METRICS = ["val_loss", "accuracy", "precision", "recall", "f1"]
+MINIMIZE = {"val_loss"}
+
+from nn_numpy import OPTIMIZERS, forward, compute_loss
+from train import (
+    load_data, train_val_split, normalize_fit, normalize_apply, train_minibatch, train_lbfgs, save_model,
+    DTYPES, DEFAULT_EPOCHS, PATIENCE, FEATURE_COLS, NPY_DATA_PATH, DATA_PATH,
+)
+from eval import confusion_counts, metrics_from_counts
+from ml.dataset_io import save_npy, load_npy
+
+_shared = {}  # per worker process: dataset directory -> memory-mapped (X, y)
+
+
+def shared_dataset(npy_dir):
+    """Map the binary dataset once per process; every task in that worker reuses the same pages."""
+    if npy_dir not in _shared:
+        _shared[npy_dir] = load_npy(Path(npy_dir), FEATURE_COLS)
+    return _shared[npy_dir]
+
+
+def fold_indices(n, fold, folds, seed=42):
+    """(train_idx, val_idx) for one fold. folds=1 is the 80/20 split train.py uses."""
+    rng = np.random.default_rng(seed)
+    idx = np.arange(n)
+    rng.shuffle(idx)
+    if folds == 1:
+        n_val = int(n * 0.2)
+        return idx[n_val:], idx[:n_val]
+    chunks = np.array_split(idx, folds)
+    val_idx = chunks[fold]
+    tr_idx = np.concatenate([c for i, c in enumerate(chunks) if i != fold])
+    return tr_idx, val_idx
+
+
+def build_configs(space, n_random=None, seed=42):
+    """Every combination of *space*, or *n_random* of them drawn without replacement."""
+    keys = list(space)
+    grid = []
+    for values in itertools.product(*(space[k] for k in keys)):
+        config = dict(zip(keys, values))
+        if config["optimizer"] == "lbfgs":  # full-batch, no learning rate
+            config.update(lr=None, batch_size=None)
+        if config not in grid:
+            grid.append(config)
+    if n_random is not None and n_random < len(grid):
+        pick = np.random.default_rng(seed).choice(len(grid), size=n_random, replace=False)
+        grid = [grid[i] for i in sorted(pick)]
+    return grid
+
+
+def fit(config, X_tr, y_tr, X_val, y_val, epochs, patience, verbose=False):
+    if config["optimizer"] == "lbfgs":
+        return train_lbfgs(X_tr, y_tr, X_val, y_val, epochs, patience,
+                           n_h1=config["n_h1"], n_h2=config["n_h2"], verbose=verbose)
+    optimizer = OPTIMIZERS[config["optimizer"]](lr=config["lr"])
+    return train_minibatch(X_tr, y_tr, X_val, y_val, optimizer, epochs, config["batch_size"], patience,
+                           n_h1=config["n_h1"], n_h2=config["n_h2"], verbose=verbose)
+
+
+def run_task(task):
+    """Train one (config, fold) on the shared dataset and score it on the fold's validation rows."""
+    npy_dir, config, fold, folds, seed, epochs, patience, dtype = task
+    X, y = shared_dataset(npy_dir)
+    tr_idx, val_idx = fold_indices(len(X), fold, folds, seed)
+    X_tr, y_tr = X[tr_idx].astype(dtype), y[tr_idx].astype(dtype)
+    X_val, y_val = X[val_idx].astype(dtype), y[val_idx].astype(dtype)
+
+    mean, std = normalize_fit(X_tr)
+    X_tr = normalize_apply(X_tr, mean, std)
+    X_val = normalize_apply(X_val, mean, std)
+
+    t0 = time.perf_counter()
+    params = fit(config, X_tr, y_tr, X_val, y_val, epochs, patience)
+    seconds = time.perf_counter() - t0
+
+    y_hat, _ = forward(X_val, params)
+    acc, precision, recall, f1 = metrics_from_counts(*confusion_counts(y_val, y_hat >= 0.5))
+    return {"val_loss": float(compute_loss(y_hat, y_val)), "accuracy": acc, "precision": precision,
+            "recall": recall, "f1": f1, "seconds": seconds}
+
+
+def share_dataset(path, tmp_dir):
+    """A memory-mappable copy of the dataset that workers open instead of receiving pickled arrays."""
+    if path.is_dir():
+        return str(path)
+    X, y = load_data(path)
+    npy_dir = Path(tmp_dir) / "dataset"
+    save_npy(npy_dir, X, y, FEATURE_COLS)
+    return str(npy_dir)
+
+
+def write_results(path, rows, keys):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=keys + METRICS + ["seconds"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with optional k-fold cross-validation")
+    parser.add_argument("--data", type=Path, default=DATA_PATH,
+                        help=f"dataset.csv or a binary dataset directory such as {NPY_DATA_PATH}")
+    parser.add_argument("--optimizer", nargs="+", choices=list(OPTIMIZERS) + ["lbfgs"],
+                        default=SEARCH_SPACE["optimizer"])
+    parser.add_argument("--lr", nargs="+", type=float, default=SEARCH_SPACE["lr"])
+    parser.add_argument("--batch-size", nargs="+", type=int, default=SEARCH_SPACE["batch_size"])
+    parser.add_argument("--n-h1", nargs="+", type=int, default=SEARCH_SPACE["n_h1"])
+    parser.add_argument("--n-h2", nargs="+", type=int, default=SEARCH_SPACE["n_h2"])
+    parser.add_argument("--random", type=int, default=None, metavar="N",
+                        help="train N configurations sampled from the grid instead of all of it")
+    parser.add_argument("--folds", type=int, default=1,
+                        help="k-fold cross-validation; 1 = the 80/20 split used by train.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS["adam"],
+                        help="maximum epochs (iterations for lbfgs) per configuration")
+    parser.add_argument("--patience", type=int, default=PATIENCE)
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float64")
+    parser.add_argument("--metric", choices=METRICS, default="f1", help="metric used to pick the best configuration")
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--out", type=Path, default=BEST_MODEL_PATH)
+    args = parser.parse_args()
+    if args.folds < 1:
+        parser.error("--folds must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    dtype = DTYPES[args.dtype]
+    space = {"optimizer": args.optimizer, "lr": args.lr, "batch_size": args.batch_size,
+             "n_h1": args.n_h1, "n_h2": args.n_h2}
+    configs = build_configs(space, args.random, args.seed)
+    print(f"Sweeping {len(configs)} configurations x {args.folds} fold(s) on {args.workers} worker(s)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        npy_dir = share_dataset(args.data, tmp_dir)
+        tasks = [(npy_dir, config, fold, args.folds, args.seed, args.epochs, args.patience, dtype)
+                 for config in configs for fold in range(args.folds)]
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            scores = list(pool.map(run_task, tasks))
+        print(f"Sweep finished in {time.perf_counter() - t0:.1f} s")
+
+        rows = []
+        for i, config in enumerate(configs):
+            folds = scores[i * args.folds:(i + 1) * args.folds]
+            row = dict(config)
+            for key in METRICS + ["seconds"]:
+                row[key] = float(np.mean([s[key] for s in folds]))
+            rows.append(row)
+        write_results(args.results, rows, list(space))
+        print(f"Results written to: {args.results}")
+
+        sign = 1 if args.metric in MINIMIZE else -1
+        rows.sort(key=lambda r: sign * r[args.metric])
+        for row in rows[:5]:
+            print("  " + "  ".join(f"{k}={row[k]}" for k in space) + "  "
+                  + "  ".join(f"{k}={row[k]:.4f}" for k in METRICS))
+
+        # refit the winner on the standard split so the saved model is comparable with train.py's
+        best = {k: rows[0][k] for k in space}
+        X, y = shared_dataset(npy_dir)
+        X_tr, y_tr, X_val, y_val = train_val_split(X, y)
+        X_tr, y_tr = X_tr.astype(dtype), y_tr.astype(dtype)
+        X_val, y_val = X_val.astype(dtype), y_val.astype(dtype)
+        mean, std = normalize_fit(X_tr)
+        params = fit(best, normalize_apply(X_tr, mean, std), y_tr, normalize_apply(X_val, mean, std), y_val,
+                     args.epochs, args.patience)
+        _shared.clear()
+
+    save_model(args.out, params, mean, std, FEATURE_COLS)
+    print(f"\nBest by {args.metric}: {best}")
+    print(f"Saved model to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
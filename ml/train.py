@@ -1,5 +1,7 @@
+import argparse
 import csv
 import sys
+import time
 from pathlib import Path
 import numpy as np
 
@@ -7,10 +9,24 @@ import numpy as np
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 DATA_PATH = ROOT / "data" / "dataset.csv"
+NPY_DATA_PATH = ROOT / "data" / "dataset"
 MODEL_DIR = ROOT / "models"
 MODEL_PATH = MODEL_DIR / "nn_model.npz"
+BLOCK_ROWS = 65536  # rows read from disk at a time in out-of-core mode
 
-from nn_numpy import init_params, forward, compute_loss, backward, update_params, predict
+OPTIMIZER = "sgd"
+PATIENCE = 10  # epochs without a val_loss improvement before training stops (0 = never)
+# per-optimizer defaults; sgd is the original setup (batch 64, 150 epochs, keep the last weights)
+DEFAULT_LR = {"sgd": 0.01, "momentum": 0.01, "adam": 0.01}
+DEFAULT_EPOCHS = {"sgd": 150, "momentum": 150, "adam": 150, "lbfgs": 500}  # L-BFGS: iterations
+DEFAULT_BATCH_SIZE = {"sgd": 64, "momentum": 64, "adam": 1024}  # L-BFGS is full-batch
+DEFAULT_PATIENCE = {"sgd": 0, "momentum": 0, "adam": PATIENCE, "lbfgs": PATIENCE}
+DTYPES = {"float64": np.float64, "float32": np.float32}
+
+from nn_numpy import (
+    OPTIMIZERS, Network, init_params, forward, compute_loss, lbfgs,
+)
+from ml.dataset_io import load_npy
 
 FEATURE_COLS = [
     "tire_wear", "laps_since_pit", "recent_pace_drop",
@@ -18,7 +34,14 @@ FEATURE_COLS = [
     "is_stuck", "lap_norm", "safety_car_active"
 ]
 
-def load_data(path):
+def load_data(path, dtype=np.float64):
+    """Load (X, y) from dataset.csv, or memory-map them from a binary dataset directory.
+
+    CSV rows are parsed into *dtype* arrays; a binary dataset is mapped in the
+    dtype it was written with.
+    """
+    if path.is_dir():
+        return load_npy(path, FEATURE_COLS)
     rows = []
     with open(path, "r", newline="") as f:
         reader = csv.DictReader(f)
@@ -26,8 +49,8 @@ def load_data(path):
             x = [float(r[c]) for c in FEATURE_COLS]
             y = int(r["label"])
             rows.append((x, y))
-    X = np.array([r[0] for r in rows], dtype=np.float64)
-    y = np.array([r[1] for r in rows], dtype=np.float64).reshape(-1, 1)
+    X = np.array([r[0] for r in rows], dtype=dtype)
+    y = np.array([r[1] for r in rows], dtype=dtype).reshape(-1, 1)
     return X, y
 
 def train_val_split(X, y, val_ratio=0.2, seed=42):
@@ -39,9 +62,10 @@ def train_val_split(X, y, val_ratio=0.2, seed=42):
     return X[tr_idx], y[tr_idx], X[val_idx], y[val_idx]
 
 def normalize_fit(X):
-    mean = X.mean(axis=0, keepdims=True)
-    std = X.std(axis=0, keepdims=True) + 1e-8
-    return mean, std
+    # statistics are accumulated in float64 and returned in X's dtype
+    mean = X.mean(axis=0, keepdims=True, dtype=np.float64)
+    std = X.std(axis=0, keepdims=True, dtype=np.float64) + 1e-8
+    return mean.astype(X.dtype, copy=False), std.astype(X.dtype, copy=False)
 
 def normalize_apply(X, mean, std):
     return (X - mean) / std
@@ -53,9 +77,125 @@ def iterate_minibatches(X, y, batch_size=64, seed=42):
     rng = np.random.default_rng(seed)
     idx = np.arange(len(X))
     rng.shuffle(idx)
+    # one gather per epoch; the batches are then contiguous slices
+    X, y = X[idx], y[idx]
     for s in range(0, len(X), batch_size):
-        b = idx[s:s+batch_size]
-        yield X[b], y[b]
+        yield X[s:s+batch_size], y[s:s+batch_size]
+
+
+class EarlyStopping:
+    """Keep the parameters with the lowest validation loss; stop after *patience* epochs without a new best.
+
+    With ``patience=0`` it is off: training runs every epoch and keeps the last parameters.
+    """
+
+    def __init__(self, patience=PATIENCE, min_delta=1e-5):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = np.inf
+        self.best_epoch = 0
+        self.best_params = None
+
+    def update(self, epoch, loss, params):
+        """Record *loss* for *epoch*; return True when training should stop."""
+        if self.patience <= 0:
+            return False
+        if loss < self.best_loss - self.min_delta:
+            self.best_loss = loss
+            self.best_epoch = epoch
+            self.best_params = {k: v.copy() for k, v in params.items()}
+        return epoch - self.best_epoch >= self.patience
+
+    def restore(self, params):
+        return self.best_params if self.best_params is not None else params
+
+
+# ---- out-of-core training ---------------------------------------------------
+# The dataset stays on disk (typically a memmap from load_data) and is read one
+# block of rows at a time. Each row is assigned to train or val by a per-block
+# seeded draw, so the split needs no index array the size of the dataset.
+
+def block_val_mask(block, size, val_ratio=0.2, seed=42):
+    return np.random.default_rng([seed, block]).random(size) < val_ratio
+
+
+def stream_blocks(X, y, part="train", block_rows=BLOCK_ROWS, val_ratio=0.2, seed=42, shuffle_seed=None,
+                  dtype=np.float64):
+    """Yield (Xb, yb) in-memory *dtype* copies of the *part* rows of each block.
+
+    With *shuffle_seed* blocks are visited in a shuffled order and rows are
+    shuffled within each block.
+    """
+    n_blocks = -(-len(X) // block_rows)
+    order = np.arange(n_blocks)
+    rng = None
+    if shuffle_seed is not None:
+        rng = np.random.default_rng(shuffle_seed)
+        rng.shuffle(order)
+    for block in order:
+        start = block * block_rows
+        stop = min(start + block_rows, len(X))
+        val = block_val_mask(block, stop - start, val_ratio, seed)
+        keep = val if part == "val" else ~val
+        Xb = np.asarray(X[start:stop], dtype=dtype)[keep]
+        yb = np.asarray(y[start:stop], dtype=dtype)[keep]
+        if rng is not None:
+            perm = rng.permutation(len(Xb))
+            Xb, yb = Xb[perm], yb[perm]
+        yield Xb, yb
+
+
+def normalize_fit_streaming(X, y, block_rows=BLOCK_ROWS, dtype=np.float64):
+    """normalize_fit over the training rows, one block at a time.
+
+    Rows are centred on the first block's mean, and each block's mean and sum
+    of squared deviations (M2) are merged into the running ones with Chan et
+    al.'s pairwise update. Large-offset features therefore lose no precision
+    to cancellation, and the result matches normalize_fit.
+    """
+    n = 0
+    shift = mean = m2 = None
+    for Xb, _ in stream_blocks(X, y, "train", block_rows):
+        nb = len(Xb)
+        if nb == 0:
+            continue
+        if shift is None:
+            shift = Xb.mean(axis=0, keepdims=True)
+            mean = np.zeros_like(shift)
+            m2 = np.zeros_like(shift)
+        Xb = Xb - shift
+        mean_b = Xb.mean(axis=0, keepdims=True)
+        m2_b = np.square(Xb - mean_b).sum(axis=0, keepdims=True)
+        delta = mean_b - mean
+        total = n + nb
+        mean = mean + delta * (nb / total)
+        m2 = m2 + m2_b + np.square(delta) * (n * nb / total)
+        n = total
+    std = np.sqrt(m2 / n) + 1e-8
+    return (shift + mean).astype(dtype), std.astype(dtype)
+
+
+def iterate_minibatches_streaming(X, y, mean, std, batch_size=64, seed=42, block_rows=BLOCK_ROWS):
+    """Shuffled, normalized training minibatches (in *mean*'s dtype); memory is bounded by one block."""
+    for Xb, yb in stream_blocks(X, y, "train", block_rows, shuffle_seed=seed, dtype=mean.dtype):
+        Xb = normalize_apply(Xb, mean, std)
+        for s in range(0, len(Xb), batch_size):
+            yield Xb[s:s+batch_size], yb[s:s+batch_size]
+
+
+def evaluate_streaming(X, y, params, mean, std, part="val", block_rows=BLOCK_ROWS, threshold=0.5):
+    """Return (loss, y_true, y_pred) over *part*, scoring one block at a time in the model's dtype."""
+    loss_sum, n = 0.0, 0
+    y_true, y_pred = [], []
+    for Xb, yb in stream_blocks(X, y, part, block_rows, dtype=params["W1"].dtype):
+        if len(Xb) == 0:
+            continue
+        y_hat, _ = forward(normalize_apply(Xb, mean, std), params)
+        loss_sum += compute_loss(y_hat, yb) * len(Xb)
+        n += len(Xb)
+        y_true.append(yb.astype(np.uint8))
+        y_pred.append((y_hat >= threshold).astype(np.uint8))
+    return loss_sum / max(n, 1), np.concatenate(y_true), np.concatenate(y_pred)
 
 
 def save_model(path, params, mean, std, feature_cols):
@@ -73,37 +213,170 @@ def save_model(path, params, mean, std, feature_cols):
         feature_cols=np.array(feature_cols),
     )
 
-def main():
-    X, y = load_data(DATA_PATH)
-    X_tr, y_tr, X_val, y_val = train_val_split(X, y)
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=Path, default=DATA_PATH,
+                        help=f"dataset.csv or a binary dataset directory such as {NPY_DATA_PATH}")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="stream blocks from the dataset instead of loading it into memory")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS)
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float64",
+                        help="floating-point type for data, normalization, the network and the saved model")
+    return parser
+
+
+def check_out_of_core(parser, args):
+    if args.out_of_core and not args.data.is_dir():
+        parser.error(f"--out-of-core streams a binary dataset directory such as {NPY_DATA_PATH} "
+                     "(collect_data.py --npy); a CSV --data would be loaded into memory whole")
 
-    mean, std = normalize_fit(X_tr)
-    X_tr = normalize_apply(X_tr, mean, std)
-    X_val = normalize_apply(X_val, mean, std)
 
-    params = init_params(n_x=9, n_h1=16, n_h2=8, seed=42)
+def parse_args():
+    return build_parser().parse_args()
 
-    lr = 0.01
-    epochs = 150
-    batch_size = 64
+
+def parse_train_args():
+    parser = build_parser()
+    parser.add_argument("--optimizer", choices=list(OPTIMIZERS) + ["lbfgs"], default=OPTIMIZER,
+                        help="lbfgs is full-batch and needs the dataset in memory")
+    parser.add_argument("--lr", type=float, default=None,
+                        help="learning rate (default depends on the optimizer; unused by lbfgs)")
+    parser.add_argument("--epochs", type=int, default=None,
+                        help="maximum epochs, or iterations for lbfgs (default depends on the optimizer)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="minibatch rows (default: 64 for sgd/momentum, 1024 for adam; unused by lbfgs)")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="stop after this many epochs without a val_loss improvement and keep the best "
+                             f"weights; 0 = never (default: 0 for sgd/momentum, {PATIENCE} for adam/lbfgs)")
+    parser.add_argument("--out", type=Path, default=MODEL_PATH)
+    args = parser.parse_args()
+    check_out_of_core(parser, args)
+    if args.optimizer == "lbfgs" and args.out_of_core:
+        parser.error("--optimizer lbfgs needs the whole training set in memory; drop --out-of-core")
+    if args.lr is None:
+        args.lr = DEFAULT_LR.get(args.optimizer)
+    if args.epochs is None:
+        args.epochs = DEFAULT_EPOCHS[args.optimizer]
+    if args.batch_size is None:
+        args.batch_size = DEFAULT_BATCH_SIZE.get(args.optimizer)
+    if args.patience is None:
+        args.patience = DEFAULT_PATIENCE[args.optimizer]
+    return args
+
+
+def log_epoch(epoch, tr_loss, va_loss, va_acc):
+    print(f"Epoch {epoch:03d} | train_loss={tr_loss:.4f} val_loss={va_loss:.4f} val_acc={va_acc:.4f}")
+
+
+def train_out_of_core(X, y, optimizer, epochs, batch_size, block_rows=BLOCK_ROWS, patience=PATIENCE,
+                      dtype=np.float64):
+    mean, std = normalize_fit_streaming(X, y, block_rows, dtype)
+    net = Network(init_params(n_x=9, n_h1=16, n_h2=8, seed=42, dtype=dtype), batch_size)
+    params = net.params
+    stopper = EarlyStopping(patience)
+
+    for epoch in range(1, epochs + 1):
+        for Xb, yb in iterate_minibatches_streaming(X, y, mean, std, batch_size, seed=epoch, block_rows=block_rows):
+            net.forward(Xb)
+            net.backward(yb)
+            net.step(optimizer)
+
+        log = epoch % 10 == 0 or epoch == 1
+        if log or patience > 0:
+            va_loss, y_val, va_pred = evaluate_streaming(X, y, params, mean, std, "val", block_rows)
+            if log:
+                tr_loss, _, _ = evaluate_streaming(X, y, params, mean, std, "train", block_rows)
+                log_epoch(epoch, tr_loss, va_loss, accuracy(va_pred, y_val))
+            if stopper.update(epoch, va_loss, params):
+                print(f"Early stop at epoch {epoch:03d} (best val_loss={stopper.best_loss:.4f} "
+                      f"at epoch {stopper.best_epoch:03d})")
+                break
+
+    return stopper.restore(params), mean, std
+
+
+def train_minibatch(X_tr, y_tr, X_val, y_val, optimizer, epochs, batch_size, patience=PATIENCE,
+                    n_h1=16, n_h2=8, verbose=True):
+    net = Network(init_params(n_x=X_tr.shape[1], n_h1=n_h1, n_h2=n_h2, seed=42, dtype=X_tr.dtype), batch_size)
+    params = net.params
+    stopper = EarlyStopping(patience)
 
     for epoch in range(1, epochs + 1):
         for Xb, yb in iterate_minibatches(X_tr, y_tr, batch_size=batch_size, seed=epoch):
-            y_hat, cache = forward(Xb, params)
-            grads = backward(params, cache, yb)
-            params = update_params(params, grads, lr=lr)
+            net.forward(Xb)
+            net.backward(yb)
+            net.step(optimizer)
 
-        if epoch % 10 == 0 or epoch == 1:
+        va_hat, _ = forward(X_val, params)
+        va_loss = compute_loss(va_hat, y_val)
+        if verbose and (epoch % 10 == 0 or epoch == 1):
             tr_hat, _ = forward(X_tr, params)
-            va_hat, _ = forward(X_val, params)
-            tr_loss = compute_loss(tr_hat, y_tr)
-            va_loss = compute_loss(va_hat, y_val)
-            va_pred = predict(X_val, params, threshold=0.5)
-            va_acc = accuracy(va_pred, y_val)
-            print(f"Epoch {epoch:03d} | train_loss={tr_loss:.4f} val_loss={va_loss:.4f} val_acc={va_acc:.4f}")
-
-    save_model(MODEL_PATH, params, mean, std, FEATURE_COLS)
-    print(f"\nSaved model to: {MODEL_PATH}")
+            log_epoch(epoch, compute_loss(tr_hat, y_tr), va_loss, accuracy((va_hat >= 0.5).astype(np.int32), y_val))
+        if stopper.update(epoch, va_loss, params):
+            if verbose:
+                print(f"Early stop at epoch {epoch:03d} (best val_loss={stopper.best_loss:.4f} "
+                      f"at epoch {stopper.best_epoch:03d})")
+            break
+
+    return stopper.restore(params)
+
+
+def train_lbfgs(X_tr, y_tr, X_val, y_val, max_iter, patience=PATIENCE, n_h1=16, n_h2=8, verbose=True):
+    """Full-batch L-BFGS over the flattened parameters, with early stopping on val_loss per iteration."""
+    net = Network(init_params(n_x=X_tr.shape[1], n_h1=n_h1, n_h2=n_h2, seed=42, dtype=X_tr.dtype), len(X_tr))
+    params = net.params  # views of net.theta
+    stopper = EarlyStopping(patience)
+
+    def fun(theta):
+        net.theta[:] = theta
+        loss, _ = net.loss_and_grads(X_tr, y_tr)
+        return loss, net.grad.copy()
+
+    def callback(it, theta, tr_loss):
+        net.theta[:] = theta
+        va_hat, _ = forward(X_val, params)
+        va_loss = compute_loss(va_hat, y_val)
+        if verbose and (it % 10 == 0 or it == 1):
+            log_epoch(it, tr_loss, va_loss, accuracy((va_hat >= 0.5).astype(np.int32), y_val))
+        if stopper.update(it, va_loss, params):
+            if verbose:
+                print(f"Early stop at iteration {it:03d} (best val_loss={stopper.best_loss:.4f} "
+                      f"at iteration {stopper.best_epoch:03d})")
+            return True
+        return False
+
+    net.theta[:] = lbfgs(fun, net.theta, max_iter=max_iter, callback=callback)
+    return stopper.restore(params)
+
+
+def main():
+    args = parse_train_args()
+    dtype = DTYPES[args.dtype]
+    X, y = load_data(args.data, dtype)
+    optimizer = OPTIMIZERS[args.optimizer](lr=args.lr) if args.optimizer in OPTIMIZERS else None
+    t0 = time.perf_counter()
+
+    if args.out_of_core:
+        params, mean, std = train_out_of_core(X, y, optimizer, args.epochs, args.batch_size,
+                                              args.block_rows, args.patience, dtype)
+    else:
+        X_tr, y_tr, X_val, y_val = train_val_split(X, y)
+        X_tr, y_tr = X_tr.astype(dtype, copy=False), y_tr.astype(dtype, copy=False)
+        X_val, y_val = X_val.astype(dtype, copy=False), y_val.astype(dtype, copy=False)
+
+        mean, std = normalize_fit(X_tr)
+        X_tr = normalize_apply(X_tr, mean, std)
+        X_val = normalize_apply(X_val, mean, std)
+
+        if args.optimizer == "lbfgs":
+            params = train_lbfgs(X_tr, y_tr, X_val, y_val, args.epochs, args.patience)
+        else:
+            params = train_minibatch(X_tr, y_tr, X_val, y_val, optimizer, args.epochs, args.batch_size,
+                                     args.patience)
+
+    print(f"Trained with {args.optimizer} in {time.perf_counter() - t0:.1f} s ({args.dtype})")
+    save_model(args.out, params, mean, std, FEATURE_COLS)
+    print(f"\nSaved model to: {args.out}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,135 +1,87 @@
 import pygame
-import math
 
-TWO_PI = 2 * math.pi
 PIT_STOP_TIME = 3.0
 PIT_LANE_SPEED_FACTOR = 0.35
+WEAR_RATES = {"aggressive": 0.009, "normal": 0.006, "conservative": 0.004}
+LAP_SPEED_HISTORY = 4
+
+# integer-coded pit phases; PHASE_NAMES gives the names the HUD and features use
+RACING, PIT_IN, PIT_STOP, PIT_OUT = 0, 1, 2, 3
+PHASE_NAMES = ("racing", "pit_in", "pit_stop", "pit_out")
+
+
+def _state_field(name, cast):
+    def fget(self):
+        return cast(getattr(self._state, name)[self._r, self._i])
+
+    def fset(self, value):
+        getattr(self._state, name)[self._r, self._i] = value
+
+    return property(fget, fset)
 
 
 class Car:
-    def __init__(self, angle, speed, center_x, center_y, radius_x, radius_y, color, car_id, driving_style):
-        self.angle = angle
-        self.speed = speed
-        self.center_x = center_x
-        self.center_y = center_y
-        self.radius_x = radius_x
-        self.radius_y = radius_y
-        self.color = color
-        self.car_id = car_id
-        self.driving_style = driving_style
-
-        self.lap_count = 0
-        self.tire_wear = 0.0
-        self.base_speed = speed
-        self.laps_since_pit = 0
-
-        if self.driving_style == "aggressive":
-            self.wear_rate = 0.009
-        elif self.driving_style == "conservative":
-            self.wear_rate = 0.004
-        else:  # normal
-            self.wear_rate = 0.006
-
-        self.x = 0
-        self.y = 0
-        self.traffic_factor = 1.0
-        self.sc_factor = 1.0
-
-        # pit state
-        self.in_pit = False
-        self.wants_pit = False
-        self.pit_timer = 0.0
-        self.pit_phase = "racing"  # racing | pit_in | pit_stop | pit_out
-
-        # for feature extraction (Sprint 3)
-        self.lap_speeds = []           # last N lap-end speeds (for recent_pace_drop)
-        self.seconds_in_traffic = 0.0  # consecutive time with traffic_factor < 1
-
-    def update(self, dt, track=None):
-        old_angle = self.angle
-
-        if self.pit_phase == "racing":
-            self._update_racing(dt, old_angle, track)
-        elif self.pit_phase == "pit_in":
-            self._update_pit_in(dt, track)
-        elif self.pit_phase == "pit_stop":
-            self._update_pit_stop(dt, track)
-        elif self.pit_phase == "pit_out":
-            self._update_pit_out(dt, track)
-
-    # --- racing (normal) ---------------------------------------------------
-
-    def _update_racing(self, dt, old_angle, track):
-        self.tire_wear += self.wear_rate * dt
-        self.tire_wear = min(self.tire_wear, 1.0)
-
-        self.tire_factor = 1 - 0.30 * self.tire_wear
-        current_speed = self.base_speed * self.tire_factor * self.traffic_factor * self.sc_factor
-        self.angle = (self.angle + current_speed * dt) % TWO_PI
-
-        if self.traffic_factor < 1.0:
-            self.seconds_in_traffic += dt
-        else:
-            self.seconds_in_traffic = 0.0
-
-        self.x = self.center_x + self.radius_x * math.cos(self.angle)
-        self.y = self.center_y + self.radius_y * math.sin(self.angle)
-
-        if old_angle > 5.0 and self.angle < 1.0:
-            self.lap_count += 1
-            self.laps_since_pit += 1
-            self.lap_speeds.append(current_speed)
-            if len(self.lap_speeds) > 4:
-                self.lap_speeds.pop(0)
-
-        if self.wants_pit and track and old_angle < self.angle:
-            if old_angle < track.pit_entry_angle <= self.angle:
-                self.in_pit = True
-                self.wants_pit = False
-                self.pit_phase = "pit_in"
-
-    # --- pit_in: driving entry -> pit box at reduced speed -----------------
-
-    def _update_pit_in(self, dt, track):
-        speed = self.base_speed * PIT_LANE_SPEED_FACTOR
-        self.angle = (self.angle + speed * dt) % TWO_PI
-
-        if track:
-            mid = (track.pit_entry_angle + track.pit_exit_angle) / 2
-            self.x, self.y = track.pit_lane_pos(self.angle)
-            if self.angle >= mid:
-                self.angle = mid
-                self.x, self.y = track.pit_lane_pos(mid)
-                self.pit_phase = "pit_stop"
-                self.pit_timer = PIT_STOP_TIME
-
-    # --- pit_stop: stationary, changing tires ------------------------------
-
-    def _update_pit_stop(self, dt, track):
-        self.pit_timer -= dt
-        if track:
-            mid = (track.pit_entry_angle + track.pit_exit_angle) / 2
-            self.x, self.y = track.pit_lane_pos(mid)
-
-        if self.pit_timer <= 0:
-            self.tire_wear = 0.0
-            self.laps_since_pit = 0
-            self.pit_phase = "pit_out"
-
-    # --- pit_out: driving pit box -> exit at reduced speed -----------------
-
-    def _update_pit_out(self, dt, track):
-        speed = self.base_speed * PIT_LANE_SPEED_FACTOR
-        self.angle = (self.angle + speed * dt) % TWO_PI
-
-        if track:
-            self.x, self.y = track.pit_lane_pos(self.angle)
-            if self.angle >= track.pit_exit_angle:
-                self.angle = track.pit_exit_angle
-                self.x = self.center_x + self.radius_x * math.cos(self.angle)
-                self.y = self.center_y + self.radius_y * math.sin(self.angle)
-                self.in_pit = False
-                self.pit_phase = "racing"
+    """One car: a view of slot *i* of race *r* in a RaceState.
+
+    The simulation state lives in the RaceState arrays; a Car only reads and
+    writes its own slot, so the HUD, feature extraction and drawing can keep
+    working with per-car attributes while every race steps as one batch.
+    """
+
+    angle = _state_field("angle", float)
+    base_speed = _state_field("base_speed", float)
+    tire_wear = _state_field("tire_wear", float)
+    wear_rate = _state_field("wear_rate", float)
+    traffic_factor = _state_field("traffic_factor", float)
+    seconds_in_traffic = _state_field("seconds_in_traffic", float)
+    lap_count = _state_field("lap_count", int)
+    laps_since_pit = _state_field("laps_since_pit", int)
+    pit_timer = _state_field("pit_timer", float)
+    wants_pit = _state_field("wants_pit", bool)
+
+    def __init__(self, state, r, i):
+        self._state = state
+        self._r = r
+        self._i = i
+        self.car_id = i + 1
+
+    @property
+    def driving_style(self):
+        return self._state.styles[self._r][self._i]
+
+    @property
+    def color(self):
+        return self._state.colors[self._i]
+
+    @property
+    def speed(self):
+        return self.base_speed
+
+    @property
+    def sc_factor(self):
+        return float(self._state.sc_factor[self._r])
+
+    @property
+    def pit_phase(self):
+        return PHASE_NAMES[self._state.pit_phase[self._r, self._i]]
+
+    @property
+    def in_pit(self):
+        return bool(self._state.pit_phase[self._r, self._i] != RACING)
+
+    @property
+    def lap_speeds(self):
+        n = self._state.lap_speed_count[self._r, self._i]
+        return self._state.lap_speeds[self._r, self._i, LAP_SPEED_HISTORY - n:].tolist()
+
+    @property
+    def x(self):
+        return self._state.position(self._r, self._i)[0]
+
+    @property
+    def y(self):
+        return self._state.position(self._r, self._i)[1]
 
     def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), 10)
\ No newline at end of file
+        x, y = self._state.position(self._r, self._i)
+        return pygame.draw.circle(screen, self.color, (int(x), int(y)), 10)
@@ -0,0 +1,322 @@
+import math
+
+import numpy as np
+
+from sim.car import PIT_STOP_TIME, PIT_LANE_SPEED_FACTOR
+from sim.race import (
+    RaceState, RACING, PIT_IN, PIT_STOP, PIT_OUT, TWO_PI, LAP_SPEED_HISTORY,
+    SC_TRIGGER_CHANCE, SC_DURATION_MIN, SC_DURATION_MAX, SC_COOLDOWN, SC_FACTOR_MIN, SC_FACTOR_MAX,
+)
+from sim.traffic import TRAFFIC_THRESHOLD_ANGLE, TRAFFIC_FACTOR_MIN, TRAFFIC_FACTOR_MAX
+
+# RaceState rolls for a safety car once per frame at 60 fps; as a continuous-time
+# process that is a constant hazard rate (per second) while no cooldown is running
+SC_TRIGGER_RATE = -math.log1p(-SC_TRIGGER_CHANCE) * 60
+
+# longest step taken while a car's speed depends on its gap to the car ahead
+TRAFFIC_STEP = 0.25
+
+# gaps this close to TRAFFIC_THRESHOLD_ANGLE count as sitting on the threshold
+TRAFFIC_EPS = 1e-9
+
+# a car on the threshold picks its regime from the speeds this far (s) ahead,
+# so a speed ratio that sits on a regime boundary is resolved by its trend
+RATIO_LOOKAHEAD = 1e-6
+
+# traffic factor below the threshold is TRAFFIC_FACTOR_MIN + _TF_SLOPE * gap
+_TF_SLOPE = (TRAFFIC_FACTOR_MAX - TRAFFIC_FACTOR_MIN) / TRAFFIC_THRESHOLD_ANGLE
+
+
+def _hit_time(distance, v, a):
+    """Smallest t > 0 with ``v*t - a*t**2/2 == distance``, else inf.
+
+    This is when something moving at speed *v* and slowing at a constant rate
+    *a* has covered *distance*; *a* may be negative (e.g. closing speeds).
+    """
+    disc = v * v - 2.0 * a * distance
+    denom = v + np.sqrt(np.maximum(disc, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = 2.0 * distance / denom
+    return np.where((disc >= 0) & (denom > 0) & (t > 0), t, np.inf)
+
+
+def _linear_root(c0, c1):
+    """Smallest t > 0 with ``c0 - c1*t == 0``, else inf."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = c0 / c1
+    return np.where(t > 0, t, np.inf)
+
+
+def _ring(angle):
+    """Index of the next car ahead of every car, and the forward gap to it."""
+    order = np.argsort(angle, axis=1)
+    rows = np.arange(angle.shape[0])[:, np.newaxis]
+    ahead = np.empty_like(order)
+    ahead[rows, order] = np.roll(order, -1, axis=1)
+    diff = np.take_along_axis(angle, ahead, axis=1) - angle
+    gaps = np.where(diff < 0, diff + TWO_PI, diff)
+    if angle.shape[1] == 1:
+        gaps[:] = TWO_PI
+    return ahead, gaps
+
+
+def _follow(value, ahead):
+    """*value* (optionally stacked on a leading axis) as seen from each car's leader."""
+    return np.take_along_axis(value, np.broadcast_to(ahead, value.shape), axis=-1)
+
+
+def _resolve_chains(fn, value, ahead):
+    """Iterate ``value = fn(value of the car ahead)`` until it settles down every chain of followers."""
+    for _ in range(ahead.shape[-1]):
+        new = fn(_follow(value, ahead))
+        if np.array_equal(new, value):
+            break
+        value = new
+    return value
+
+
+class EventRaceState(RaceState):
+    """RaceState that jumps from event to event instead of stepping at 60 Hz.
+
+    Between events a free car's motion is analytic: tire wear grows linearly,
+    so speed falls linearly and the angle is quadratic in time. Each ``step``
+    moves every race to its own next event (lap crossing, pit-entry angle,
+    pit box reached, pit stop done, pit exit, wear reaching 1 or the pit
+    threshold, a car closing to ``TRAFFIC_THRESHOLD_ANGLE`` behind another,
+    safety car start or end) and handles it exactly.
+
+    A car within the threshold of the car ahead ("traffic") has its gap
+    integrated in closed form (the gap relaxes exponentially towards the gap
+    at which both cars run at the same speed), in steps of at most
+    TRAFFIC_STEP. A faster car held exactly at the threshold, which RaceState
+    models as its traffic factor flickering between 1 and 0.9 every frame,
+    rides at the speed of the car ahead with the equivalent average factor;
+    at a lap crossing its factor is drawn as 0.9 or 1 in those proportions,
+    so lap features see the same values as under RaceState.
+
+    Races keep their own clocks (``time``), so one step advances different
+    races by different amounts. Safety cars start after an exponential
+    waiting time matching RaceState's per-frame trigger chance. Results are
+    statistically, not bit-for-bit, equivalent to RaceState.
+    """
+
+    def __init__(self, track, styles, base_speed=1.0, colors=None, rngs=None):
+        super().__init__(track, styles, base_speed, colors, rngs)
+        self.time = np.zeros(self.n_races)
+        # while no safety car is out, safety_car_timer counts down to the next one
+        self.safety_car_timer = np.array([self._next_safety_car(g) for g in self.rngs])
+
+    @staticmethod
+    def _next_safety_car(rng):
+        return rng.exponential(1.0 / SC_TRIGGER_RATE)
+
+    def step(self, dt=None, active=None):
+        """Advance every race to its next event; return a mask of completed laps.
+
+        *dt* is accepted so the engine can stand in for RaceState and is not
+        used: step lengths come from the events themselves.
+        """
+        self.frame += 1
+        if self.pit_wear_threshold is not None:
+            self.wants_pit |= (self.pit_phase == RACING) & (self.tire_wear >= self.pit_wear_threshold)
+        laws = self._speed_laws()
+        times, step = self._event_times(laws, active)
+        lapped = self._advance(step, laws, times)
+        for r in np.flatnonzero((self.safety_car_timer <= 0) & (step > 0)):
+            self._toggle_safety_car(r)
+        return lapped
+
+    def _speed_laws(self):
+        """Speed law ``s(t) = S - B*t`` of every car for this step, and how it follows the car ahead.
+
+        Returns ``(ahead, gaps, near, u0, uA, S, B, SL, BL, slide, traffic, approx)``.
+        """
+        racing = self.pit_phase == RACING
+        pit_in, pit_out = self.pit_phase == PIT_IN, self.pit_phase == PIT_OUT
+        wear = self.tire_wear
+
+        ahead, gaps = _ring(self.angle)
+
+        # free-running speed u(t) = u0 - uA*t, i.e. with no car ahead
+        wearing = racing & (wear < 1.0)
+        scale = self.base_speed * self.sc_factor[:, np.newaxis]
+        lane_speed = self.base_speed * PIT_LANE_SPEED_FACTOR
+        u0 = np.where(racing, scale * (1 - 0.30 * wear), np.where(pit_in | pit_out, lane_speed, 0.0))
+        uA = np.where(wearing, scale * 0.30 * self.wear_rate, 0.0)
+
+        # speed law of every car, from the leaders of each chain down
+        near = racing & (np.abs(gaps - TRAFFIC_THRESHOLD_ANGLE) < TRAFFIC_EPS)
+        below = racing & ~near & (gaps < TRAFFIC_THRESHOLD_ANGLE)
+        tf = TRAFFIC_FACTOR_MIN + _TF_SLOPE * np.minimum(gaps, TRAFFIC_THRESHOLD_ANGLE)
+        SB = np.stack((u0, uA))
+        u_h = u0 - uA * RATIO_LOOKAHEAD
+
+        def regimes(SL, BL):
+            SL_h = SL - BL * RATIO_LOOKAHEAD
+            slide = near & (SL_h > TRAFFIC_FACTOR_MAX * u_h) & (SL_h < u_h)
+            traffic = below | (near & (SL_h <= TRAFFIC_FACTOR_MAX * u_h))
+            return slide, traffic
+
+        def speed_law(leader):
+            SL, BL = leader
+            slide, traffic = regimes(SL, BL)
+            S = np.where(slide, SL, np.where(traffic, tf * u0, u0))
+            B = np.where(slide, BL, np.where(traffic, tf * uA - _TF_SLOPE * (SL - tf * u0) * u0, uA))
+            return np.stack((S, B))
+
+        S, B = _resolve_chains(speed_law, SB, ahead)
+        SL, BL = _follow(S, ahead), _follow(B, ahead)
+        slide, traffic = regimes(SL, BL)
+        # cars whose motion is only approximated this step: in traffic, or riding behind one
+        approx = _resolve_chains(lambda approx_ahead: traffic | (slide & approx_ahead), traffic, ahead)
+        return ahead, gaps, near, u0, uA, S, B, SL, BL, slide, traffic, approx
+
+    def _event_times(self, laws, active):
+        """Time to every kind of event from the start of the step, and each race's step length."""
+        _, gaps, near, u0, uA, S, B, SL, BL, slide, traffic, approx = laws
+        phase = self.pit_phase
+        racing = phase == RACING
+        pit_in, pit_stop, pit_out = phase == PIT_IN, phase == PIT_STOP, phase == PIT_OUT
+        wear, angle = self.tire_wear, self.angle
+        wearing = racing & (wear < 1.0)
+        lane_speed = self.base_speed * PIT_LANE_SPEED_FACTOR
+
+        track = self.track
+        entry = track.pit_entry_angle
+        inf = np.full(wear.shape, np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_lap = np.where(racing, _hit_time(TWO_PI - angle, S, B), np.inf)
+            t_enter = np.where(racing & self.wants_pit & (angle < entry), _hit_time(entry - angle, S, B), np.inf)
+            t_worn = np.where(wearing, (1.0 - wear) / self.wear_rate, np.inf)
+            t_want = inf
+            if self.pit_wear_threshold is not None:
+                thr = self.pit_wear_threshold
+                t_want = np.where(racing & ~self.wants_pit & (wear < thr), (thr - wear) / self.wear_rate, np.inf)
+            t_arrive = np.where(pit_in, (self.pit_mid_angle - angle) / lane_speed, np.inf)
+            t_stop = np.where(pit_stop, self.pit_timer, np.inf)
+            t_exit = np.where(pit_out, (track.pit_exit_angle - angle) / lane_speed, np.inf)
+
+            # interactions with the car ahead
+            free = racing & ~slide & ~traffic
+            t_close = np.where(free, _hit_time(gaps - TRAFFIC_THRESHOLD_ANGLE, S - SL, B - BL), np.inf)
+            t_pass = _hit_time(gaps, S - SL, B - BL)
+            t_open = np.where(traffic, _hit_time(TRAFFIC_THRESHOLD_ANGLE - gaps, SL - S, BL - B), np.inf)
+            # on the threshold, the ratio of the leader's speed to our free speed decides the regime
+            t_ratio = np.minimum(_linear_root(SL - u0, BL - uA),
+                                 _linear_root(SL - TRAFFIC_FACTOR_MAX * u0, BL - TRAFFIC_FACTOR_MAX * uA))
+            t_ratio = np.where(near & (t_ratio > RATIO_LOOKAHEAD), t_ratio, np.inf)
+
+        events = (t_lap, t_enter, t_worn, t_want, t_arrive, t_stop, t_exit, t_close, t_pass, t_open, t_ratio)
+        step = np.minimum(np.min([t.min(axis=1) for t in events], axis=0), self.safety_car_timer)
+        step = np.where(approx.any(axis=1), np.minimum(step, TRAFFIC_STEP), step)
+        if active is not None:
+            step = np.where(active, step, 0.0)
+        return (t_lap, t_enter, t_worn, t_want, t_arrive, t_stop, t_exit), step
+
+    def _advance(self, step, laws, times):
+        """Move every car by its race's *step* and handle the events that fall on it."""
+        ahead, gaps, _, u0, uA, S, B, SL, BL, slide, traffic, _ = laws
+        t_lap, t_enter, t_worn, t_want, t_arrive, t_stop, t_exit = times
+        phase = self.pit_phase
+        racing = phase == RACING
+        pit_in, pit_stop, pit_out = phase == PIT_IN, phase == PIT_STOP, phase == PIT_OUT
+        wear, angle = self.tire_wear, self.angle
+        track = self.track
+        entry = track.pit_entry_angle
+        # only cars that wanted to pit at the start of the step can take the entry during it
+        wanted = self.wants_pit.copy()
+
+        # move every car to the event
+        t = step[:, np.newaxis]
+        D_own = S * t - 0.5 * B * t * t
+        u_t = u0 - uA * t
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # traffic gap: g' = sL(t) - u(t) * (TRAFFIC_FACTOR_MIN + _TF_SLOPE * g), with k held at its start value
+            k = _TF_SLOPE * u0
+            alpha = SL - TRAFFIC_FACTOR_MIN * u0
+            beta = TRAFFIC_FACTOR_MIN * uA - BL
+            g_p0 = alpha / k - beta / (k * k)
+            g_t = (alpha + beta * t) / k - beta / (k * k) + (gaps - g_p0) * np.exp(-k * t)
+        g_t = np.where(traffic, g_t, gaps)
+        tf_t = TRAFFIC_FACTOR_MIN + _TF_SLOPE * np.clip(g_t, 0.0, TRAFFIC_THRESHOLD_ANGLE)
+
+        def displacement(DV_ahead):
+            DL, VL = DV_ahead
+            D = np.where(traffic, DL + gaps - g_t, np.where(slide, DL, D_own))
+            V = np.where(traffic, tf_t * u_t, np.where(slide, VL, S - B * t))
+            return np.stack((D, V))
+
+        D, V = _resolve_chains(displacement, np.stack((D_own, S - B * t)), ahead)
+
+        new_angle = angle + D
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.traffic_factor = np.where(traffic, tf_t, np.where(slide, V / u_t, 1.0))
+        self.tire_wear = np.where(racing, np.minimum(wear + self.wear_rate * t, 1.0), wear)
+        # a sliding car's factor flickers back to 1 every other frame in RaceState, resetting the count
+        self.seconds_in_traffic = np.where(racing, np.where(traffic, self.seconds_in_traffic + t, 0.0),
+                                           self.seconds_in_traffic)
+        self.pit_timer = np.where(pit_stop, self.pit_timer - t, self.pit_timer)
+        self.safety_car_timer = self.safety_car_timer - step
+        self.time += step
+
+        # handle every event that falls on this time; cars whose motion was
+        # approximated can also cross a line a little before its predicted time
+        moving = t > 0
+        lapped = racing & moving & ((t_lap <= t) | (new_angle >= TWO_PI))
+        self.angle = np.where(lapped, np.where(t_lap <= t, 0.0, new_angle - TWO_PI), new_angle)
+        if lapped.any():
+            # a lap crossing in RaceState catches a sliding car's factor at 0.9 or 1; it is
+            # 0.9 in the share of frames that averages out to the speed of the car ahead
+            for r, i in zip(*np.nonzero(lapped & slide)):
+                p = (1.0 - self.traffic_factor[r, i]) / (1.0 - TRAFFIC_FACTOR_MAX)
+                self.traffic_factor[r, i] = TRAFFIC_FACTOR_MAX if self.rngs[r].random() < p else 1.0
+                V[r, i] = self.traffic_factor[r, i] * u_t[r, i]
+            self.lap_count += lapped
+            self.laps_since_pit += lapped
+            history = self.lap_speeds[lapped]
+            history[:, :-1] = history[:, 1:]
+            history[:, -1] = V[lapped]
+            self.lap_speeds[lapped] = history
+            self.lap_speed_count[lapped] = np.minimum(self.lap_speed_count[lapped] + 1, LAP_SPEED_HISTORY)
+
+        worn = moving & (t_worn <= t)
+        self.tire_wear[worn] = 1.0
+        if self.pit_wear_threshold is not None:
+            want = moving & (t_want <= t)
+            self.tire_wear[want] = self.pit_wear_threshold
+            self.wants_pit |= want
+
+        enter = racing & wanted & moving & ((t_enter <= t) | ((angle < entry) & (new_angle >= entry)))
+        if enter.any():
+            self.angle[enter] = entry
+            self.wants_pit &= ~enter
+            self.pit_phase[enter] = PIT_IN
+            self.pit_stops += enter
+
+        arrived = moving & pit_in & ((t_arrive <= t) | (new_angle >= self.pit_mid_angle))
+        self.angle[arrived] = self.pit_mid_angle
+        self.pit_phase[arrived] = PIT_STOP
+        self.pit_timer[arrived] = PIT_STOP_TIME
+
+        done = moving & (t_stop <= t)
+        self.pit_timer[done] = 0.0
+        self.tire_wear[done] = 0.0
+        self.laps_since_pit[done] = 0
+        self.pit_phase[done] = PIT_OUT
+
+        rejoined = moving & pit_out & ((t_exit <= t) | (new_angle >= track.pit_exit_angle))
+        self.angle[rejoined] = track.pit_exit_angle
+        self.pit_phase[rejoined] = RACING
+
+        return lapped
+
+    def _toggle_safety_car(self, r):
+        rng = self.rngs[r]
+        if self.safety_car_active[r]:
+            self.safety_car_active[r] = False
+            self.sc_factor[r] = 1.0
+            self.safety_car_timer[r] = SC_COOLDOWN + self._next_safety_car(rng)
+        else:
+            self.safety_car_active[r] = True
+            self.safety_car_timer[r] = rng.uniform(SC_DURATION_MIN, SC_DURATION_MAX)
+            self.sc_factor[r] = rng.uniform(SC_FACTOR_MIN, SC_FACTOR_MAX)
@@ -1,146 +1,160 @@
-import math
-import random
+import argparse
+import os
 import sys
+import time
 from pathlib import Path
 
 import numpy as np
 import pygame
 
-from car import Car
-from render import draw_hud
+from render import Renderer
 from track import Track
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-from ml.features import extract
-from ml.nn_numpy import predict_proba
+from ml.features import extract_batch
+from ml.inference import apply_pit_recommendations
+from ml.registry import load_model
+from sim.instrument import Instrumentation
+from sim.race import RaceState
 
-TRAFFIC_THRESHOLD_ANGLE = 0.20
-TRAFFIC_FACTOR_MIN = 0.75
-TRAFFIC_FACTOR_MAX = 0.90
-TWO_PI = 2 * math.pi
 TOTAL_LAPS = 50
-
-SC_TRIGGER_CHANCE = 0.003      # per-frame probability when eligible
-SC_DURATION_MIN = 4.0          # seconds
-SC_DURATION_MAX = 8.0
-SC_COOLDOWN = 15.0             # seconds before another SC can trigger
-SC_FACTOR_MIN = 0.60
-SC_FACTOR_MAX = 0.80
-
-PIT_WEAR_THRESHOLD = 0.75
-
-def load_saved_model():
-    model_path = ROOT / "models" / "nn_model.npz"
-    data = np.load(model_path, allow_pickle=True)
-
-    params = {
-        "W1": data["W1"], "b1": data["b1"],
-        "W2": data["W2"], "b2": data["b2"],
-        "W3": data["W3"], "b3": data["b3"],
-    }
-    mean = data["mean"]
-    std = data["std"]
-    return params, mean, std
-
-
-def update_traffic_factors(cars):
-    for car in cars:
-        gap = TWO_PI  # no car ahead
-        for other in cars:
-            if other is car:
-                continue
-            diff = (other.angle - car.angle) % TWO_PI
-            if 0 < diff < gap:
-                gap = diff
-        if gap >= TRAFFIC_THRESHOLD_ANGLE:
-            car.traffic_factor = 1.0
-        else:
-            t = gap / TRAFFIC_THRESHOLD_ANGLE if TRAFFIC_THRESHOLD_ANGLE > 0 else 1.0
-            car.traffic_factor = TRAFFIC_FACTOR_MIN + (TRAFFIC_FACTOR_MAX - TRAFFIC_FACTOR_MIN) * t
-
-
-pygame.init()
+FPS = 60
 WIDTH, HEIGHT = 1200, 800
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("F1 Pit Stop Predictor")
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 36)
-
-track = Track(center_x=WIDTH // 2, center_y=HEIGHT // 2, radius_x=400, radius_y=250)
-
-spacing = TWO_PI / 5
-cars = [
-    Car(angle=spacing * 0, speed=1.0, center_x=track.center_x, center_y=track.center_y,
-        radius_x=track.centerline_rx, radius_y=track.centerline_ry, color=(255, 0, 0), car_id=1, driving_style="aggressive"),
-    Car(angle=spacing * 1, speed=1.0, center_x=track.center_x, center_y=track.center_y,
-        radius_x=track.centerline_rx, radius_y=track.centerline_ry, color=(0, 0, 255), car_id=2, driving_style="normal"),
-    Car(angle=spacing * 2, speed=1.0, center_x=track.center_x, center_y=track.center_y,
-        radius_x=track.centerline_rx, radius_y=track.centerline_ry, color=(0, 255, 0), car_id=3, driving_style="conservative"),
-    Car(angle=spacing * 3, speed=1.0, center_x=track.center_x, center_y=track.center_y,
-        radius_x=track.centerline_rx, radius_y=track.centerline_ry, color=(255, 165, 0), car_id=4, driving_style="aggressive"),
-    Car(angle=spacing * 4, speed=1.0, center_x=track.center_x, center_y=track.center_y,
-        radius_x=track.centerline_rx, radius_y=track.centerline_ry, color=(255, 255, 0), car_id=5, driving_style="normal"),
-]
-
-model_params, norm_mean, norm_std = load_saved_model()
-nn_state = {car.car_id: {"label": "N/A", "conf": 0.0} for car in cars}
-auto_mode = False
-
-safety_car_active = False
-safety_car_timer = 0.0
-safety_car_cooldown = 0.0
-sc_factor = 1.0
-
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
-            auto_mode = not auto_mode
-
-    dt = clock.tick(60) / 1000.0
-
-    # --- safety car state machine ---
-    if safety_car_active:
-        safety_car_timer -= dt
-        if safety_car_timer <= 0:
-            safety_car_active = False
-            safety_car_cooldown = SC_COOLDOWN
-            sc_factor = 1.0
+TRACK_MARGIN = 150  # loaded tracks are scaled to leave this much room for the HUD
+
+STYLES = ["aggressive", "normal", "conservative", "aggressive", "normal"]
+COLORS = [(255, 0, 0), (0, 0, 255), (0, 255, 0), (255, 165, 0), (255, 255, 0)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="F1 Pit Stop Predictor simulation")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window; implies --fast and runs until the race is over")
+    parser.add_argument("--fast", action="store_true",
+                        help="fixed timestep with no frame cap (fast-forward)")
+    parser.add_argument("--dt", type=float, default=1.0 / FPS, help="fixed timestep in seconds")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="draw every Nth frame, 0 = never (default: 1, or 0 when headless)")
+    parser.add_argument("--auto", action="store_true", help="start in AUTO (NN) mode")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--track", type=Path, default=None,
+                        help="track JSON (e.g. ../assets/tracks/kidney.json); default: the oval")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-phase timings and event counts on exit")
+    parser.add_argument("--trace", type=Path, default=None,
+                        help="with --profile, also write a Chrome trace JSON to this path")
+    args = parser.parse_args()
+    if args.headless:
+        args.fast = True
+    if args.render_every is None:
+        args.render_every = 0 if args.headless else 1
+    return args
+
+
+def print_results(race, finish_time, sim_time, wall_time, auto_mode):
+    print(f"\nRace over after {sim_time:.2f} sim seconds ({wall_time:.2f} s wall, "
+          f"{sim_time / max(wall_time, 1e-9):.0f}x real time), mode: {'AUTO (NN)' if auto_mode else 'RECOMMENDATION'}")
+    order = np.argsort(finish_time, kind="stable")
+    for pos, i in enumerate(order, start=1):
+        car = race.cars[i]
+        print(f"  P{pos}  Car {car.car_id} ({car.driving_style:<12}) "
+              f"{finish_time[i]:8.2f} s  pit stops: {race.pit_stops[0, i]}")
+
+
+def main():
+    args = parse_args()
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+    pygame.init()
+    if args.headless:
+        screen = pygame.Surface((WIDTH, HEIGHT))
+    else:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("F1 Pit Stop Predictor")
+    clock = pygame.time.Clock()
+    font = pygame.font.Font(None, 36)
+
+    if args.track is not None:
+        track = Track.load(args.track, fit=(WIDTH, HEIGHT), margin=TRACK_MARGIN)
     else:
-        safety_car_cooldown = max(0.0, safety_car_cooldown - dt)
-        if safety_car_cooldown == 0.0 and random.random() < SC_TRIGGER_CHANCE:
-            safety_car_active = True
-            safety_car_timer = random.uniform(SC_DURATION_MIN, SC_DURATION_MAX)
-            sc_factor = random.uniform(SC_FACTOR_MIN, SC_FACTOR_MAX)
-
-    screen.fill((20, 20, 20))
-    track.draw(screen)
-
-    update_traffic_factors(cars)
-    for car in cars:
-        car.sc_factor = sc_factor
-        if not car.wants_pit and not car.in_pit and car.tire_wear >= PIT_WEAR_THRESHOLD:
-            car.wants_pit = True
-        old_lap = car.lap_count
-        car.update(dt, track)
-        car.draw(screen)
-
-        if car.lap_count > old_lap:
-            _, feat_row = extract(car, cars, safety_car_active, TOTAL_LAPS)
-            x = np.array(feat_row, dtype=np.float64).reshape(1, -1)
-            x = (x - norm_mean) / norm_std
-
-            proba = float(predict_proba(x, model_params)[0, 0])
-            label = "PIT" if proba >= 0.5 else "STAY OUT"
-            nn_state[car.car_id] = {"label": label, "conf": proba}
-            if auto_mode and label == "PIT" and not car.in_pit and not car.wants_pit:
-                car.wants_pit = True
-
-    draw_hud(screen, font, cars, safety_car_active, nn_state, auto_mode)
-    pygame.display.flip()
-
-pygame.quit()
\ No newline at end of file
+        track = Track.oval(center_x=WIDTH // 2, center_y=HEIGHT // 2, radius_x=400, radius_y=250)
+    race = RaceState(track, styles=STYLES, base_speed=1.0, colors=COLORS,
+                     rngs=[np.random.default_rng(args.seed)])
+    cars = race.cars
+
+    predictor = load_model().predictor()
+    nn_state = {car.car_id: {"label": "N/A", "conf": 0.0} for car in cars}
+    auto_mode = args.auto
+
+    renderer = Renderer(screen, track, font)
+
+    def render():
+        dirty = renderer.draw(cars, race.safety_car_active[0], nn_state, auto_mode)
+        if not args.headless:
+            pygame.display.update(dirty)
+
+    extract, predict = extract_batch, predictor.predict_proba
+    instrumentation = Instrumentation(trace=args.trace is not None) if args.profile else None
+    if instrumentation is not None:
+        instrumentation.instrument_race(race)
+        extract = instrumentation.timed("features", extract)
+        predict = instrumentation.timed("nn_inference", predict)
+        render = instrumentation.timed("rendering", render)
+
+    finish_time = np.full(race.n_cars, np.inf)
+    sim_time = 0.0
+    frame = 0
+    wall_start = time.perf_counter()
+
+    running = True
+    while running:
+        if not args.headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                    auto_mode = not auto_mode
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    renderer.invalidate()
+
+        dt = args.dt if args.fast else clock.tick(FPS) / 1000.0
+
+        lapped = race.step(dt)
+        sim_time += dt
+        frame += 1
+
+        # all lap completions of this frame go through the network in one batch
+        races, slots = np.nonzero(lapped)
+        if len(slots):
+            proba = predict(extract(race, races, slots, TOTAL_LAPS))[:, 0]
+            for i, p in zip(slots, proba):
+                label = "PIT" if p >= 0.5 else "STAY OUT"
+                nn_state[cars[i].car_id] = {"label": label, "conf": float(p)}
+            if auto_mode:
+                apply_pit_recommendations(race, races, slots, proba)
+            finished = race.lap_count[0] >= TOTAL_LAPS
+            finish_time[finished & np.isinf(finish_time)] = sim_time
+
+        if args.render_every and frame % args.render_every == 0:
+            render()
+
+        # interactive real-time runs keep going until the window is closed
+        if args.fast and np.isfinite(finish_time).all():
+            running = False
+
+    if np.isfinite(finish_time).all():
+        print_results(race, finish_time, sim_time, time.perf_counter() - wall_start, auto_mode)
+    if instrumentation is not None:
+        instrumentation.stop()
+        print("\n" + instrumentation.summary())
+        if args.trace is not None:
+            instrumentation.write_trace(args.trace)
+            print(f"Wrote trace to {args.trace}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
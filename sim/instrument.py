@@ -0,0 +1,146 @@
+import json
+import os
+import time
+from collections import defaultdict
+
+# per engine class: the step methods timed by Instrumentation.instrument_race, and the phase they count towards
+RACE_PHASES = {
+    "RaceState": {
+        "_next_draws": "rng",
+        "_update_safety_car": "safety_car",
+        "_update_traffic": "traffic",
+        "_update_racing": "physics",
+        "_update_pit_lane": "physics",
+        "_update_pit_stop": "physics",
+    },
+    "EventRaceState": {
+        "_speed_laws": "traffic",
+        "_event_times": "events",
+        "_advance": "physics",
+        "_toggle_safety_car": "safety_car",
+    },
+}
+
+
+class Instrumentation:
+    """Per-phase timings and event counts for a race loop.
+
+    Nothing here runs unless a loop opts in: callers wrap the functions they
+    want timed with :meth:`timed` (or :meth:`instrument_race` for a RaceState),
+    so a loop built without an Instrumentation pays no overhead at all.
+
+    With ``trace=True`` every timed call is also kept as a Chrome trace event
+    (viewable in chrome://tracing or Perfetto); see :meth:`write_trace`.
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.events = defaultdict(int)
+        self.trace_events = []
+        self._start = time.perf_counter()
+        self.wall = 0.0
+
+    def timed(self, phase, fn):
+        """Return *fn* wrapped so each call adds its duration to *phase*."""
+        seconds, calls = self.seconds, self.calls
+        clock = time.perf_counter
+
+        if not self.trace:
+            def wrapper(*args, **kwargs):
+                t0 = clock()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    seconds[phase] += clock() - t0
+                    calls[phase] += 1
+            return wrapper
+
+        events, pid, origin = self.trace_events, os.getpid(), self._start
+
+        def traced(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                t1 = clock()
+                seconds[phase] += t1 - t0
+                calls[phase] += 1
+                events.append({"name": phase, "ph": "X", "pid": pid, "tid": 0,
+                               "ts": (t0 - origin) * 1e6, "dur": (t1 - t0) * 1e6})
+        return traced
+
+    def count(self, event, n=1):
+        self.events[event] += int(n)
+
+    def instrument_race(self, state):
+        """Time the phases of ``state.step`` and count laps, pit entries and safety-car periods.
+
+        Only this RaceState instance is affected: its methods are shadowed by
+        timed wrappers in the instance dict. The methods come from RACE_PHASES
+        for the nearest class in the state's MRO; an engine without an entry
+        raises ValueError rather than being timed as "other".
+        """
+        engines = [cls.__name__ for cls in type(state).__mro__ if cls.__name__ in RACE_PHASES]
+        if not engines:
+            raise ValueError(f"no RACE_PHASES entry for {type(state).__name__}")
+        for name, phase in RACE_PHASES[engines[0]].items():
+            setattr(state, name, self.timed(phase, getattr(state, name)))
+
+        step = state.step
+
+        def counted_step(dt, active=None):
+            pit_stops = int(state.pit_stops.sum())
+            sc_before = state.safety_car_active.copy()  # the event engine toggles it in place
+            lapped = step(dt, active)
+            self.count("frames")
+            self.count("laps", lapped.sum())
+            self.count("pit_entries", int(state.pit_stops.sum()) - pit_stops)
+            self.count("safety_car_periods", (state.safety_car_active & ~sc_before).sum())
+            return lapped
+
+        state.step = counted_step
+
+    def stop(self):
+        """Freeze the wall-clock total used by :meth:`summary`."""
+        self.wall = time.perf_counter() - self._start
+
+    def merge(self, other):
+        """Add the timings, counts and trace of *other* (e.g. from a worker process)."""
+        for phase, s in other.seconds.items():
+            self.seconds[phase] += s
+            self.calls[phase] += other.calls[phase]
+        for event, n in other.events.items():
+            self.events[event] += n
+        self.trace_events.extend(other.trace_events)
+
+    def as_dict(self):
+        return {
+            "wall_seconds": self.wall,
+            "phases": {
+                phase: {"calls": self.calls[phase], "seconds": s}
+                for phase, s in sorted(self.seconds.items(), key=lambda kv: -kv[1])
+            },
+            "events": dict(self.events),
+        }
+
+    def summary(self):
+        """Human-readable table of phase timings (slowest first) and event counts."""
+        wall = max(self.wall or time.perf_counter() - self._start, 1e-9)
+        lines = [f"{'phase':<14} {'calls':>9} {'total s':>9} {'per call':>11} {'share':>7}"]
+        for phase, info in self.as_dict()["phases"].items():
+            s, calls = info["seconds"], info["calls"]
+            lines.append(f"{phase:<14} {calls:>9} {s:>9.3f} {s / max(calls, 1) * 1e6:>8.1f} µs {s / wall:>7.1%}")
+        other = max(wall - sum(self.seconds.values()), 0.0)
+        lines.append(f"{'other':<14} {'':>9} {other:>9.3f} {'':>11} {other / wall:>7.1%}")
+        lines.append(f"{'wall':<14} {'':>9} {wall:>9.3f}")
+        if self.events:
+            lines.append("")
+            lines.extend(f"{event:<20} {n:>10}" for event, n in self.events.items())
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """Write the summary plus trace events as JSON in Chrome trace format."""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events, "summary": self.as_dict()}, f)
@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+
+from sim.car import (
+    Car, PIT_STOP_TIME, PIT_LANE_SPEED_FACTOR, WEAR_RATES, LAP_SPEED_HISTORY,
+    RACING, PIT_IN, PIT_STOP, PIT_OUT,
+)
+from sim.traffic import ahead_gaps, traffic_factor
+
+TWO_PI = 2 * math.pi
+
+SC_TRIGGER_CHANCE = 0.003      # per-frame probability when eligible
+SC_DURATION_MIN = 4.0          # seconds
+SC_DURATION_MAX = 8.0
+SC_COOLDOWN = 15.0             # seconds before another SC can trigger
+SC_FACTOR_MIN = 0.60
+SC_FACTOR_MAX = 0.80
+
+PIT_WEAR_THRESHOLD = 0.75
+
+# per-race random draws are generated this many frames at a time
+RNG_BLOCK = 256
+_DRAWS_PER_FRAME = 3  # safety-car trigger, duration, speed factor
+
+
+class RaceState:
+    """Struct-of-arrays race engine: one vectorized step advances every car of every race.
+
+    Car state lives in NumPy arrays of shape (n_races, n_cars); safety-car state
+    has shape (n_races,). Each race draws from its own ``np.random.Generator``,
+    consuming a fixed number of values per frame, so a race's outcome depends only
+    on its own stream and not on which batch it runs in. ``race_cars(r)`` (and
+    ``cars`` for race 0) exposes :class:`~sim.car.Car` views so the HUD and
+    feature extraction keep working.
+    """
+
+    def __init__(self, track, styles, base_speed=1.0, colors=None, rngs=None):
+        if styles and isinstance(styles[0], str):
+            styles = [styles]  # a single race
+        n_races, n = len(styles), len(styles[0])
+        shape = (n_races, n)
+        self.track = track
+        self.n_races = n_races
+        self.n_cars = n
+        self.styles = [list(s) for s in styles]
+        self.colors = list(colors) if colors is not None else [(0, 0, 0)] * n
+        self.rngs = list(rngs) if rngs is not None else [np.random.default_rng() for _ in range(n_races)]
+        self.pit_wear_threshold = PIT_WEAR_THRESHOLD  # None disables the baseline rule
+
+        self.angle = np.tile(np.arange(n, dtype=np.float64) * (TWO_PI / n), (n_races, 1))
+        self.base_speed = np.full(shape, base_speed, dtype=np.float64)
+        self.tire_wear = np.zeros(shape)
+        self.wear_rate = np.array([[WEAR_RATES.get(s, WEAR_RATES["normal"]) for s in race]
+                                   for race in self.styles])
+        self.traffic_factor = np.ones(shape)
+        self.seconds_in_traffic = np.zeros(shape)
+        self.lap_count = np.zeros(shape, dtype=np.int64)
+        self.laps_since_pit = np.zeros(shape, dtype=np.int64)
+        self.lap_speeds = np.zeros(shape + (LAP_SPEED_HISTORY,))
+        self.lap_speed_count = np.zeros(shape, dtype=np.int64)
+
+        self.pit_phase = np.full(shape, RACING, dtype=np.int8)
+        self.pit_timer = np.zeros(shape)
+        self.wants_pit = np.zeros(shape, dtype=bool)
+        self.pit_stops = np.zeros(shape, dtype=np.int64)
+
+        self.safety_car_active = np.zeros(n_races, dtype=bool)
+        self.safety_car_timer = np.zeros(n_races)
+        self.safety_car_cooldown = np.zeros(n_races)
+        self.sc_factor = np.ones(n_races)
+
+        self.frame = 0
+        self._draws = None
+        self.pit_mid_angle = (track.pit_entry_angle + track.pit_exit_angle) / 2
+        self._views = {}
+
+    @property
+    def in_pit(self):
+        return self.pit_phase != RACING
+
+    @property
+    def cars(self):
+        return self.race_cars(0)
+
+    def race_cars(self, r):
+        """Car views of every car in race *r*."""
+        views = self._views.get(r)
+        if views is None:
+            views = [Car(self, r, i) for i in range(self.n_cars)]
+            self._views[r] = views
+        return views
+
+    # ---- stepping ---------------------------------------------------------
+
+    def step(self, dt, active=None):
+        """Advance every race by *dt*; return an (n_races, n_cars) mask of completed laps.
+
+        Races where *active* is False are frozen (their cars do not move).
+        """
+        draws = self._next_draws()
+        self._update_safety_car(dt, draws)
+        self._update_traffic()
+
+        phase = self.pit_phase
+        racing = phase == RACING
+        if self.pit_wear_threshold is not None:
+            self.wants_pit |= racing & (self.tire_wear >= self.pit_wear_threshold)
+
+        if active is None and racing.all():
+            return self._update_racing(dt, None)
+        # phase masks are taken before any transition so each car runs one phase per step
+        pit_in, pit_stop, pit_out = phase == PIT_IN, phase == PIT_STOP, phase == PIT_OUT
+        if active is not None:
+            moving = active[:, np.newaxis]
+            racing &= moving
+            pit_in &= moving
+            pit_stop &= moving
+            pit_out &= moving
+        lapped = self._update_racing(dt, racing)
+        if pit_in.any() or pit_out.any():
+            self._update_pit_lane(dt, pit_in, pit_out)
+        if pit_stop.any():
+            self._update_pit_stop(dt, pit_stop)
+        return lapped
+
+    def _next_draws(self):
+        k = self.frame % RNG_BLOCK
+        if k == 0:
+            self._draws = np.stack([g.random((RNG_BLOCK, _DRAWS_PER_FRAME)) for g in self.rngs])
+        self.frame += 1
+        return self._draws[:, k]
+
+    def _update_safety_car(self, dt, draws):
+        was_active = self.safety_car_active
+        timer = np.where(was_active, self.safety_car_timer - dt, self.safety_car_timer)
+        ended = was_active & (timer <= 0)
+        cooldown = np.where(was_active,
+                            np.where(ended, SC_COOLDOWN, self.safety_car_cooldown),
+                            np.maximum(0.0, self.safety_car_cooldown - dt))
+        started = ~was_active & (cooldown == 0.0) & (draws[:, 0] < SC_TRIGGER_CHANCE)
+
+        duration = SC_DURATION_MIN + (SC_DURATION_MAX - SC_DURATION_MIN) * draws[:, 1]
+        factor = SC_FACTOR_MIN + (SC_FACTOR_MAX - SC_FACTOR_MIN) * draws[:, 2]
+        self.safety_car_active = (was_active & ~ended) | started
+        self.safety_car_timer = np.where(started, duration, timer)
+        self.safety_car_cooldown = cooldown
+        self.sc_factor = np.where(started, factor, np.where(ended, 1.0, self.sc_factor))
+
+    def _update_traffic(self):
+        gaps, _ = ahead_gaps(self.angle)
+        self.traffic_factor = traffic_factor(gaps)
+
+    def _update_racing(self, dt, mask):
+        """Racing physics for the cars in *mask* (``None`` means every car)."""
+        wear = np.minimum(self.tire_wear + self.wear_rate * dt, 1.0)
+        tire_factor = 1 - 0.30 * wear
+        speed = self.base_speed * tire_factor * self.traffic_factor * self.sc_factor[:, np.newaxis]
+        old_angle = self.angle
+        angle = (old_angle + speed * dt) % TWO_PI
+        in_traffic = np.where(self.traffic_factor < 1.0, self.seconds_in_traffic + dt, 0.0)
+        crossed = angle < old_angle  # progress only wraps at the start/finish line
+        entry = self.track.pit_entry_angle
+        enter = self.wants_pit & (old_angle < entry) & (entry <= angle)
+
+        if mask is None:
+            self.tire_wear = wear
+            self.angle = angle
+            self.seconds_in_traffic = in_traffic
+        else:
+            self.tire_wear = np.where(mask, wear, self.tire_wear)
+            self.angle = np.where(mask, angle, old_angle)
+            self.seconds_in_traffic = np.where(mask, in_traffic, self.seconds_in_traffic)
+            crossed &= mask
+            enter &= mask
+
+        if crossed.any():
+            self.lap_count += crossed
+            self.laps_since_pit += crossed
+            history = self.lap_speeds[crossed]
+            history[:, :-1] = history[:, 1:]
+            history[:, -1] = speed[crossed]
+            self.lap_speeds[crossed] = history
+            self.lap_speed_count[crossed] = np.minimum(self.lap_speed_count[crossed] + 1, LAP_SPEED_HISTORY)
+
+        if enter.any():
+            self.wants_pit &= ~enter
+            self.pit_phase[enter] = PIT_IN
+            self.pit_stops += enter
+        return crossed
+
+    def _update_pit_lane(self, dt, pit_in, pit_out):
+        # pit_in drives to the box at pit-lane speed, pit_out from the box to the exit
+        angle = (self.angle + self.base_speed * PIT_LANE_SPEED_FACTOR * dt) % TWO_PI
+        arrived = pit_in & (angle >= self.pit_mid_angle)
+        rejoined = pit_out & (angle >= self.track.pit_exit_angle)
+        angle = np.where(arrived, self.pit_mid_angle, angle)
+        angle = np.where(rejoined, self.track.pit_exit_angle, angle)
+        self.angle = np.where(pit_in | pit_out, angle, self.angle)
+
+        self.pit_phase[arrived] = PIT_STOP
+        self.pit_timer[arrived] = PIT_STOP_TIME
+        self.pit_phase[rejoined] = RACING
+
+    def _update_pit_stop(self, dt, mask):
+        self.pit_timer[mask] -= dt
+        done = mask & (self.pit_timer <= 0)
+        self.tire_wear[done] = 0.0
+        self.laps_since_pit[done] = 0
+        self.pit_phase[done] = PIT_OUT
+
+    # ---- positions (only needed for drawing) ------------------------------
+
+    def position(self, r, i):
+        """Return (x, y) of car *i* in race *r*: centerline when racing, pit lane otherwise."""
+        a = self.angle[r, i]
+        if self.pit_phase[r, i] == RACING:
+            return self.track.centerline_pos(a)
+        return self.track.pit_lane_pos(a)
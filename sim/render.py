@@ -1,58 +1,155 @@
 import pygame
 
-def draw_hud(screen, font, cars, safety_car_active=False, nn_state=None, auto_mode=False):
-    mode_font = pygame.font.Font(None, 30)
-    hud_font = pygame.font.Font(None, 28)
-    y_offset = 46
-
-    if safety_car_active:
-        sc_text = font.render("SAFETY CAR", True, (255, 200, 0))
-        sc_rect = sc_text.get_rect(centerx=screen.get_width() // 2, y=10)
-        pygame.draw.rect(screen, (80, 60, 0), sc_rect.inflate(20, 8))
-        screen.blit(sc_text, sc_rect)
-
-    mode_text = "MODE: AUTO (NN)" if auto_mode else "MODE: RECOMMENDATION"
-    mode_color = (120, 255, 120) if auto_mode else (180, 180, 180)
-    mode_surface = mode_font.render(mode_text + " | Press A to toggle", True, mode_color)
-    screen.blit(mode_surface, (10, 10))
-
-    for car in cars:
-        lap_text = hud_font.render(f"Car {car.car_id}: Lap {car.lap_count}", True, car.color)
-        screen.blit(lap_text, (10, y_offset))
-
-        bar_x = 155
-        bar_y = y_offset + 4
-        bar_width = 130
-        bar_height = 16
-
-        pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height))
-
-        fill_width = int(bar_width * car.tire_wear)
-        if car.tire_wear < 0.5:
+BACKGROUND = (20, 20, 20)
+BAR_X, BAR_WIDTH, BAR_HEIGHT = 155, 130, 16
+ROW_HEIGHT = 46
+MAX_CACHED_SURFACES = 1024
+CAR_RECT_SIZE = 22  # car circles have radius 10
+
+
+class Hud:
+    """HUD overlay (laps, tire bars, safety car, pit status, NN recommendation).
+
+    Fonts are created once and every piece of text or tire bar is rendered
+    once per distinct value, so a frame whose numbers did not change costs a
+    few dictionary lookups.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.mode_font = pygame.font.Font(None, 30)
+        self.hud_font = pygame.font.Font(None, 28)
+        self._surfaces = {}
+
+    def _cached(self, key, build):
+        surface = self._surfaces.get(key)
+        if surface is None:
+            if len(self._surfaces) >= MAX_CACHED_SURFACES:
+                self._surfaces.clear()
+            surface = self._surfaces[key] = build()
+        return surface
+
+    def text(self, font, text, color):
+        return self._cached((id(font), text, color), lambda: font.render(text, True, color))
+
+    def _safety_car_banner(self):
+        def build():
+            text = self.font.render("SAFETY CAR", True, (255, 200, 0))
+            banner = pygame.Surface(text.get_rect().inflate(20, 8).size)
+            banner.fill((80, 60, 0))
+            banner.blit(text, (10, 4))
+            return banner
+        return self._cached("safety_car", build)
+
+    def _tire_bar(self, tire_wear):
+        fill_width = int(BAR_WIDTH * tire_wear)
+        if tire_wear < 0.5:
             color = (0, 255, 0)
-        elif car.tire_wear < 0.75:
+        elif tire_wear < 0.75:
             color = (255, 255, 0)
         else:
             color = (255, 0, 0)
 
-        pygame.draw.rect(screen, color, (bar_x, bar_y, fill_width, bar_height))
-
-        if car.in_pit:
-            pit_label = hud_font.render("IN PIT", True, (255, 200, 0))
-            screen.blit(pit_label, (bar_x + bar_width + 10, y_offset))
-        elif car.wants_pit:
-            pit_label = hud_font.render("PIT SOON", True, (180, 180, 180))
-            screen.blit(pit_label, (bar_x + bar_width + 10, y_offset))
-
-        if nn_state and car.car_id in nn_state:
-            rec = nn_state[car.car_id]
-            label_short = "PIT" if rec["label"] == "PIT" else "STAY"
-            nn_text = hud_font.render(
-                f"NN | CAR {car.car_id}: {label_short} ({rec['conf']:.2f})",
-                True,
-                (200, 220, 255),
-            )
-            nn_rect = nn_text.get_rect(topright=(screen.get_width() - 20, y_offset))
-            screen.blit(nn_text, nn_rect)
-
-        y_offset += 46
\ No newline at end of file
+        def build():
+            bar = pygame.Surface((BAR_WIDTH, BAR_HEIGHT))
+            bar.fill((50, 50, 50))
+            bar.fill(color, (0, 0, fill_width, BAR_HEIGHT))
+            return bar
+        return self._cached(("bar", fill_width, color), build)
+
+    def items(self, width, cars, safety_car_active=False, nn_state=None, auto_mode=False):
+        """{slot: (surface, rect)} for everything the HUD shows this frame."""
+        items = {}
+        if safety_car_active:
+            banner = self._safety_car_banner()
+            items["safety_car"] = (banner, banner.get_rect(centerx=width // 2, y=6))
+
+        mode_text = "MODE: AUTO (NN)" if auto_mode else "MODE: RECOMMENDATION"
+        mode_color = (120, 255, 120) if auto_mode else (180, 180, 180)
+        mode_surface = self.text(self.mode_font, mode_text + " | Press A to toggle", mode_color)
+        items["mode"] = (mode_surface, mode_surface.get_rect(topleft=(10, 10)))
+
+        y_offset = ROW_HEIGHT
+        for car in cars:
+            lap_text = self.text(self.hud_font, f"Car {car.car_id}: Lap {car.lap_count}", car.color)
+            items["lap", car.car_id] = (lap_text, lap_text.get_rect(topleft=(10, y_offset)))
+            bar = self._tire_bar(car.tire_wear)
+            items["bar", car.car_id] = (bar, bar.get_rect(topleft=(BAR_X, y_offset + 4)))
+
+            if car.in_pit:
+                pit_label = self.text(self.hud_font, "IN PIT", (255, 200, 0))
+            elif car.wants_pit:
+                pit_label = self.text(self.hud_font, "PIT SOON", (180, 180, 180))
+            else:
+                pit_label = None
+            if pit_label is not None:
+                items["pit", car.car_id] = (pit_label, pit_label.get_rect(topleft=(BAR_X + BAR_WIDTH + 10, y_offset)))
+
+            if nn_state and car.car_id in nn_state:
+                rec = nn_state[car.car_id]
+                label_short = "PIT" if rec["label"] == "PIT" else "STAY"
+                nn_text = self.text(self.hud_font, f"NN | CAR {car.car_id}: {label_short} ({rec['conf']:.2f})",
+                                    (200, 220, 255))
+                items["nn", car.car_id] = (nn_text, nn_text.get_rect(topright=(width - 20, y_offset)))
+
+            y_offset += ROW_HEIGHT
+        return items
+
+
+class Renderer:
+    """Draws frames over the pre-rendered track, touching only what changed.
+
+    :meth:`draw` restores the track under last frame's and this frame's cars
+    and under HUD items that changed or overlap those areas, draws the cars
+    and those items again, and returns the dirty rectangles to pass to
+    ``pygame.display.update``. The first frame is drawn in full.
+    """
+
+    def __init__(self, screen, track, font, background=BACKGROUND):
+        self.screen = screen
+        self.background = track.render_static(screen.get_size(), background)
+        self.hud = Hud(font)
+        self._car_rects = []
+        self._items = None  # HUD items currently on screen
+
+    def invalidate(self):
+        """Redraw the whole frame next time (e.g. after the window was exposed)."""
+        self._items = None
+
+    @staticmethod
+    def car_rect(car):
+        """A rect containing everything ``car.draw`` will touch."""
+        rect = pygame.Rect(0, 0, CAR_RECT_SIZE, CAR_RECT_SIZE)
+        rect.center = (int(car.x), int(car.y))
+        return rect
+
+    def draw(self, cars, safety_car_active=False, nn_state=None, auto_mode=False):
+        screen, background = self.screen, self.background
+        items = self.hud.items(screen.get_width(), cars, safety_car_active, nn_state, auto_mode)
+        car_rects = [self.car_rect(car) for car in cars]
+
+        if self._items is None:
+            screen.blit(background, (0, 0))
+            dirty = [screen.get_rect()]
+        else:
+            dirty = self._car_rects + car_rects
+            unchanged = []
+            for slot in self._items.keys() | items.keys():
+                old, new = self._items.get(slot), items.get(slot)
+                if old is not None and new is not None and old[0] is new[0] and old[1] == new[1]:
+                    unchanged.append(new[1])
+                else:
+                    dirty.extend(item[1] for item in (old, new) if item is not None)
+            # text is anti-aliased, so an item can only be drawn again over fresh background
+            dirty.extend(rect for rect in unchanged if rect.collidelist(dirty) != -1)
+            for rect in dirty:
+                screen.blit(background, rect, rect)
+
+        for car in cars:
+            car.draw(screen)
+        for surface, rect in items.values():
+            if rect.collidelist(dirty) != -1:
+                screen.blit(surface, rect)
+        self._car_rects = car_rects
+        self._items = items
+        return dirty
@@ -1,110 +1,236 @@
-import pygame
+import json
 import math
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+import pygame
 
 TWO_PI = 2 * math.pi
+LOOKUP_SIZE = 4096      # samples per lookup table; interpolation error stays far below a pixel
+DRAW_STEPS = 240        # points per boundary polyline when the track is rendered
+SPLINE_STEPS = 16       # points per control-point segment of a spline centerline
+
+
+def ellipse_points(center_x, center_y, radius_x, radius_y, steps=DRAW_STEPS):
+    return [(center_x + radius_x * math.cos(TWO_PI * i / steps), center_y + radius_y * math.sin(TWO_PI * i / steps))
+            for i in range(steps)]
+
+
+def catmull_rom(points, steps=SPLINE_STEPS):
+    """Closed Catmull-Rom spline through *points*, *steps* samples per segment."""
+    P = np.asarray(points, dtype=np.float64)
+    t = np.arange(steps)[:, np.newaxis] / steps
+    out = []
+    for i in range(len(P)):
+        p0, p1, p2, p3 = P[i - 1], P[i], P[(i + 1) % len(P)], P[(i + 2) % len(P)]
+        out.append(0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2
+                          + (3 * p1 - p0 - 3 * p2 + p3) * t ** 3))
+    return np.concatenate(out)
+
+
+class PathTable:
+    """A polyline indexed by distance along it.
+
+    The cumulative arc length of the vertices is kept for exact O(log n)
+    lookups (:meth:`point_at`); in addition the path is resampled at
+    *size* evenly spaced distances, so :meth:`pos` and :meth:`heading` for a
+    fraction ``u`` of the length are an O(1) table lookup plus linear
+    interpolation.
+    """
+
+    def __init__(self, points, closed=True, size=LOOKUP_SIZE):
+        P = np.asarray(points, dtype=np.float64)
+        if closed:
+            P = np.vstack([P, P[:1]])
+        self.points = P
+        self.cumulative = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(P, axis=0).T))])
+        self.length = float(self.cumulative[-1])
+        self.closed = closed
+
+        s = np.linspace(0.0, self.length, size + 1)
+        xs, ys = np.interp(s, self.cumulative, P[:, 0]), np.interp(s, self.cumulative, P[:, 1])
+        self.n = size
+        self.xs, self.ys = xs.tolist(), ys.tolist()
+        self.headings = np.arctan2(np.diff(ys), np.diff(xs)).tolist()
+        self._cumulative = self.cumulative.tolist()
+
+    def pos(self, u):
+        """(x, y) at fraction *u* of the length (extrapolated linearly outside [0, 1])."""
+        t = u * self.n
+        k = min(max(int(t), 0), self.n - 1)
+        f = t - k
+        xs, ys = self.xs, self.ys
+        return xs[k] + (xs[k + 1] - xs[k]) * f, ys[k] + (ys[k + 1] - ys[k]) * f
+
+    def heading(self, u):
+        """Direction of travel (radians, screen coordinates) at fraction *u*."""
+        return self.headings[min(max(int(u * self.n), 0), self.n - 1)]
+
+    def point_at(self, distance):
+        """Exact (x, y) at *distance* along the polyline."""
+        k = min(max(bisect_right(self._cumulative, distance) - 1, 0), len(self.points) - 2)
+        seg = self._cumulative[k + 1] - self._cumulative[k]
+        f = (distance - self._cumulative[k]) / seg if seg else 0.0
+        (x0, y0), (x1, y1) = self.points[k], self.points[k + 1]
+        return x0 + (x1 - x0) * f, y0 + (y1 - y0) * f
+
+    def signed_area(self):
+        x, y = self.points[:, 0], self.points[:, 1]
+        return 0.5 * float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]))
 
 
 class Track:
-    def __init__(self, center_x, center_y, radius_x, radius_y, track_width=100):
-        self.center_x = center_x
-        self.center_y = center_y
-        self.radius_x = radius_x
-        self.radius_y = radius_y
+    """A closed-loop circuit around a centerline polyline (or spline).
+
+    Lap progress -- ``angle`` in the simulators -- runs from 0 to 2π in
+    proportion to distance along the centerline, so a car's progress speed
+    is the same everywhere on the lap and gaps, traffic thresholds, lap
+    crossings and the pit entry/exit points are all in normalized distance.
+    The physics only reads ``pit_entry_angle`` and ``pit_exit_angle``; the
+    geometry is used for drawing. The pit lane runs inside the track from
+    *pit_entry* to *pit_exit* (fractions of a lap, not crossing the line).
+    """
+
+    def __init__(self, centerline, track_width=100, pit_entry=0.15, pit_exit=0.35, pit_lane_offset=50,
+                 spline=False, name="track"):
+        if not 0.0 < pit_entry < pit_exit < 1.0:
+            raise ValueError(f"pit lane must satisfy 0 < pit_entry < pit_exit < 1, got {pit_entry}, {pit_exit}")
+        if len(centerline) < 3:
+            raise ValueError("a closed track needs at least 3 centerline points")
+        self.name = name
         self.track_width = track_width
-
-        self.inner_rx = radius_x - track_width
-        self.inner_ry = radius_y - track_width
-        self.centerline_rx = (radius_x + self.inner_rx) / 2
-        self.centerline_ry = (radius_y + self.inner_ry) / 2
+        self.centerline = PathTable(catmull_rom(centerline) if spline else centerline)
+        self.length = self.centerline.length
+        self._inward = 1.0 if self.centerline.signed_area() > 0 else -1.0
 
         self.start_finish_angle = 0
-
-        # pit lane geometry (bottom section of the oval)
-        self.pit_entry_angle = math.pi * 0.30   # ~54°  right-bottom area
-        self.pit_exit_angle = math.pi * 0.70    # ~126° left-bottom area
-        self.pit_lane_offset = 50               # pixels inside the inner boundary
-
-        self.pit_lane_rx = self.inner_rx - self.pit_lane_offset
-        self.pit_lane_ry = self.inner_ry - self.pit_lane_offset
-
-        self._build_pit_points()
-
-    def _build_pit_points(self):
-        steps = 40
-        self.pit_lane_points = []
-        for i in range(steps + 1):
-            t = i / steps
-            a = self.pit_entry_angle + (self.pit_exit_angle - self.pit_entry_angle) * t
-            x = self.center_x + self.pit_lane_rx * math.cos(a)
-            y = self.center_y + self.pit_lane_ry * math.sin(a)
-            self.pit_lane_points.append((x, y))
+        self.pit_entry_angle = TWO_PI * pit_entry
+        self.pit_exit_angle = TWO_PI * pit_exit
+        self.pit_lane_offset = pit_lane_offset  # pixels inside the inner boundary
+
+        self._build_outline()
+        self._build_pit_lane()
+        self._static = {}  # (size, background) -> pre-rendered Surface
+
+    @classmethod
+    def oval(cls, center_x, center_y, radius_x, radius_y, track_width=100):
+        """The original elliptical circuit: *radius_x*/*radius_y* are the outer boundary."""
+        track = cls(ellipse_points(center_x, center_y, radius_x - track_width / 2, radius_y - track_width / 2,
+                                   LOOKUP_SIZE),
+                    track_width, name="oval")
+        track.center_x, track.center_y = center_x, center_y
+        track.radius_x, track.radius_y = radius_x, radius_y
+        return track
+
+    @classmethod
+    def load(cls, path, fit=None, margin=60):
+        """Read a track from JSON.
+
+        Keys: ``centerline`` (list of [x, y]), and optionally ``spline``,
+        ``track_width``, ``pit_entry``, ``pit_exit``, ``pit_lane_offset`` and
+        ``name``. With *fit* = (width, height) the layout is scaled and
+        centered to fill that window less *margin*; widths and offsets are
+        in window pixels either way.
+        """
+        path = Path(path)
+        with open(path) as f:
+            spec = json.load(f)
+        points = np.asarray(spec["centerline"], dtype=np.float64)
+        if fit is not None:
+            lo, hi = points.min(axis=0), points.max(axis=0)
+            scale = min((fit[0] - 2 * margin) / max(hi[0] - lo[0], 1e-9),
+                        (fit[1] - 2 * margin) / max(hi[1] - lo[1], 1e-9))
+            points = (points - (lo + hi) / 2) * scale + np.array(fit) / 2
+        options = {k: spec[k] for k in ("track_width", "pit_entry", "pit_exit", "pit_lane_offset", "spline")
+                   if k in spec}
+        return cls(points.tolist(), name=spec.get("name", path.stem), **options)
+
+    # ---- geometry ---------------------------------------------------------
+
+    def _offset(self, u, d):
+        """The point *d* pixels inside the centerline at lap fraction *u*."""
+        x, y = self.centerline.pos(u)
+        h = self.centerline.heading(u)
+        return x - self._inward * d * math.sin(h), y + self._inward * d * math.cos(h)
+
+    def _build_outline(self, steps=DRAW_STEPS):
+        half = self.track_width / 2
+        fractions = [i / steps for i in range(steps)]
+        self.centerline_points = [self.centerline.pos(u) for u in fractions]
+        self.outer_points = [self._offset(u, -half) for u in fractions]
+        self.inner_points = [self._offset(u, half) for u in fractions]
+
+    def _build_pit_lane(self, steps=40):
+        d = self.track_width / 2 + self.pit_lane_offset
+        u0, u1 = self.pit_entry_angle / TWO_PI, self.pit_exit_angle / TWO_PI
+        self.pit_lane_points = [self._offset(u0 + (u1 - u0) * i / steps, d) for i in range(steps + 1)]
+        self.pit_lane = PathTable(self.pit_lane_points, closed=False)
 
     def angle_in_pit_zone(self, angle):
         """Return True if *angle* is between pit entry and pit exit."""
         a = angle % TWO_PI
         return self.pit_entry_angle <= a <= self.pit_exit_angle
 
+    def distance(self, angle):
+        """Distance along the centerline (pixels) covered by lap progress *angle*."""
+        return angle / TWO_PI * self.length
+
+    def centerline_pos(self, angle):
+        """Return (x, y) on the centerline for lap progress *angle*."""
+        return self.centerline.pos(angle / TWO_PI)
+
+    def heading(self, angle):
+        """Direction of travel on the centerline at lap progress *angle*."""
+        return self.centerline.heading(angle / TWO_PI)
+
     def pit_lane_pos(self, angle):
-        """Return (x, y) on the pit lane arc for a given angle."""
-        x = self.center_x + self.pit_lane_rx * math.cos(angle)
-        y = self.center_y + self.pit_lane_ry * math.sin(angle)
-        return x, y
+        """Return (x, y) on the pit lane for lap progress *angle* between entry and exit."""
+        return self.pit_lane.pos((angle - self.pit_entry_angle) / (self.pit_exit_angle - self.pit_entry_angle))
 
     # ---- drawing ----------------------------------------------------------
 
-    def draw(self, screen):
-        # outer boundary
-        pygame.draw.ellipse(screen, (100, 100, 100),
-            (self.center_x - self.radius_x, self.center_y - self.radius_y,
-             self.radius_x * 2, self.radius_y * 2), 5)
+    def render_static(self, size, background=(20, 20, 20)):
+        """The track drawn once onto a *background*-filled surface of *size*, cached.
 
-        # inner boundary
-        pygame.draw.ellipse(screen, (100, 100, 100),
-            (self.center_x - self.inner_rx, self.center_y - self.inner_ry,
-             self.inner_rx * 2, self.inner_ry * 2), 5)
+        Nothing on it changes during a race, so renderers blit (parts of) this
+        surface instead of redrawing the geometry every frame.
+        """
+        key = (tuple(size), tuple(background))
+        if key not in self._static:
+            surface = pygame.Surface(size)
+            surface.fill(background)
+            self.draw(surface)
+            self._static[key] = surface
+        return self._static[key]
+
+    def draw(self, screen):
+        # boundaries
+        pygame.draw.lines(screen, (100, 100, 100), True, self.outer_points, 5)
+        pygame.draw.lines(screen, (100, 100, 100), True, self.inner_points, 5)
 
         # centerline
-        points = []
-        for i in range(120):
-            a = TWO_PI * i / 120
-            x = self.center_x + self.centerline_rx * math.cos(a)
-            y = self.center_y + self.centerline_ry * math.sin(a)
-            points.append((x, y))
-        pygame.draw.lines(screen, (60, 60, 60), True, points, 1)
+        pygame.draw.lines(screen, (60, 60, 60), True, self.centerline_points, 1)
 
         # start/finish line
-        a = self.start_finish_angle
-        inner_x = self.center_x + self.inner_rx * math.cos(a)
-        inner_y = self.center_y + self.inner_ry * math.sin(a)
-        outer_x = self.center_x + self.radius_x * math.cos(a)
-        outer_y = self.center_y + self.radius_y * math.sin(a)
-        pygame.draw.line(screen, (255, 255, 255), (inner_x, inner_y), (outer_x, outer_y), 3)
+        half = self.track_width / 2
+        pygame.draw.line(screen, (255, 255, 255), self._offset(0.0, half), self._offset(0.0, -half), 3)
 
         self._draw_pit_lane(screen)
 
     def _draw_pit_lane(self, screen):
         # pit lane path
-        if len(self.pit_lane_points) > 1:
-            pygame.draw.lines(screen, (200, 160, 60), False, self.pit_lane_points, 2)
-
-        # entry marker
-        a = self.pit_entry_angle
-        inner = (self.center_x + self.inner_rx * math.cos(a),
-                 self.center_y + self.inner_ry * math.sin(a))
-        pit = self.pit_lane_pos(a)
-        pygame.draw.line(screen, (0, 200, 0), inner, pit, 2)
-
-        # exit marker
-        a = self.pit_exit_angle
-        inner = (self.center_x + self.inner_rx * math.cos(a),
-                 self.center_y + self.inner_ry * math.sin(a))
-        pit = self.pit_lane_pos(a)
-        pygame.draw.line(screen, (200, 0, 0), inner, pit, 2)
+        pygame.draw.lines(screen, (200, 160, 60), False, self.pit_lane_points, 2)
+
+        # entry and exit markers, from the inner boundary to the pit lane
+        half = self.track_width / 2
+        for angle, pit, color in ((self.pit_entry_angle, self.pit_lane_points[0], (0, 200, 0)),
+                                  (self.pit_exit_angle, self.pit_lane_points[-1], (200, 0, 0))):
+            pygame.draw.line(screen, color, self._offset(angle / TWO_PI, half), pit, 2)
 
         # "PIT" label
-        mid_angle = (self.pit_entry_angle + self.pit_exit_angle) / 2
-        lx, ly = self.pit_lane_pos(mid_angle)
+        lx, ly = self.pit_lane_pos((self.pit_entry_angle + self.pit_exit_angle) / 2)
         font = pygame.font.Font(None, 24)
         label = font.render("PIT", True, (200, 160, 60))
         screen.blit(label, (int(lx) - label.get_width() // 2,
-                            int(ly) - label.get_height() // 2 - 20))
\ No newline at end of file
+                            int(ly) - label.get_height() // 2 - 20))
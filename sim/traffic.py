@@ -0,0 +1,75 @@
+import math
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+TWO_PI = 2 * math.pi
+
+TRAFFIC_THRESHOLD_ANGLE = 0.20
+TRAFFIC_FACTOR_MIN = 0.75
+TRAFFIC_FACTOR_MAX = 0.90
+
+
+def forward_diff(a_from, a_to):
+    """Angular distance travelling forward from *a_from* to *a_to*, in (0, 2π]."""
+    diff = a_to - a_from
+    return np.where(diff > 0, diff, diff + TWO_PI)
+
+
+def traffic_factor(gap):
+    """Speed factor for a car whose nearest car ahead is *gap* radians away."""
+    slowed = TRAFFIC_FACTOR_MIN + (TRAFFIC_FACTOR_MAX - TRAFFIC_FACTOR_MIN) * (gap / TRAFFIC_THRESHOLD_ANGLE)
+    return np.where(gap >= TRAFFIC_THRESHOLD_ANGLE, 1.0, slowed)
+
+
+def ahead_gaps(angles, order=None):
+    """Gap from every car to the nearest car strictly ahead, over the last axis.
+
+    Sorts the field once (O(n log n)) and reads each car's neighbour in the
+    sorted ring. Cars level with each other are skipped; with no other car
+    ahead the gap is a full lap (2π). Returns ``(gaps, order)``.
+    """
+    if order is None:
+        order = np.argsort(angles, axis=-1)
+    a = angles.reshape(-1, angles.shape[-1])
+    idx = order.reshape(a.shape)
+    rows = np.arange(a.shape[0])[:, np.newaxis]
+    s = a[rows, idx]
+    step = s[:, 1:] - s[:, :-1]
+    gaps = np.concatenate((step, forward_diff(s[:, -1:], s[:, :1])), axis=1)
+
+    # a car level with the next one in the ring takes that car's gap
+    tied = np.concatenate((step == 0, np.zeros((a.shape[0], 1), dtype=bool)), axis=1)
+    while tied.any():
+        resolved = tied & ~np.roll(tied, -1, axis=1)
+        gaps = np.where(resolved, np.roll(gaps, -1, axis=1), gaps)
+        tied &= ~resolved
+
+    out = np.empty_like(gaps)
+    out[rows, idx] = gaps
+    return out.reshape(angles.shape), order
+
+
+def nearest_gaps(angle, other_angles):
+    """Forward distance to the nearest car ahead and back to the nearest car behind.
+
+    *other_angles* must not include the car itself. Either value is ``None``
+    when no other car is at a different angle.
+    """
+    s = sorted(other_angles)
+    if not s:
+        return None, None
+    j = bisect_right(s, angle)
+    ahead = (s[j % len(s)] - angle) % TWO_PI
+    i = bisect_left(s, angle) - 1
+    behind = (s[i] - angle) % TWO_PI  # s[-1] wraps to the car furthest round
+    return (ahead if ahead > 0 else None), (TWO_PI - behind if behind > 0 else None)
+
+
+def update_traffic_factors(cars):
+    """Set ``traffic_factor`` on a list of Car objects from the gap to the car ahead."""
+    if not cars:
+        return
+    gaps, _ = ahead_gaps(np.array([c.angle for c in cars]))
+    for c, f in zip(cars, traffic_factor(gaps).tolist()):
+        c.traffic_factor = f
@@ -0,0 +1,40 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ml.dataset_io import DatasetWriter, load_npy, progress_path
+from ml.features import FEATURE_NAMES
+
+
+def race_rows(race, n=3):
+    """*n* made-up dataset rows for race index *race* (features then label)."""
+    return [[race + k / 10] * len(FEATURE_NAMES) + [k % 2] for k in range(n)]
+
+
+def test_resume_after_moving_the_data_directory(tmp_path):
+    data = tmp_path / "data"
+    writer = DatasetWriter(data / "dataset.csv", seed=0, npy_dir=data / "dataset")
+    writer.write_races(2, [race_rows(0), race_rows(1)])
+    writer.close()
+    assert json.loads(progress_path(data / "dataset.csv").read_text())["npy_dir"] == "dataset"
+
+    moved = tmp_path / "elsewhere"
+    shutil.move(data, moved)
+    writer = DatasetWriter(moved / "dataset.csv", seed=0, resume=True)
+    assert writer.npy_dir == moved / "dataset"
+    writer.write_races(3, [race_rows(2)])
+    writer.close()
+    writer = DatasetWriter(moved / "dataset.csv", seed=0, resume=True, npy_dir=moved / "dataset")
+    writer.write_races(4, [race_rows(3)])
+    writer.close()
+
+    X, y = load_npy(moved / "dataset")
+    expected = np.array(race_rows(0) + race_rows(1) + race_rows(2) + race_rows(3))
+    np.testing.assert_array_equal(X, expected[:, :-1])
+    np.testing.assert_array_equal(y[:, 0], expected[:, -1])
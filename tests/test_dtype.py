@@ -0,0 +1,77 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "ml"))
+
+from ml.collect_data import make_track, race_rng, run_races
+from ml.dataset_io import DatasetWriter
+from ml.inference import Predictor
+from nn_numpy import OPTIMIZERS, compute_loss, forward
+from train import load_data, normalize_apply, normalize_fit, train_minibatch, train_val_split
+
+RACES = 12
+EPOCHS = 30
+# float32 training must reproduce the float64 run on the same data and initial weights to within
+# these (observed: 2.5e-6, 1.5e-8, no flips, 5e-7)
+PROBA_TOL = 1e-4      # max |p32 - p64| over the validation rows
+LOSS_TOL = 1e-5       # |val_loss32 - val_loss64|
+FLIP_TOL = 0.005      # share of validation rows whose predicted class differs
+PREDICTOR_TOL = 1e-5  # the same weights served by a float32 vs a float64 Predictor
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """A small simulated dataset.csv, written the way collect_data writes it."""
+    path = tmp_path_factory.mktemp("data") / "dataset.csv"
+    writer = DatasetWriter(path, seed=0)
+    writer.write_races(RACES, run_races(make_track(), [race_rng(0, k) for k in range(RACES)]))
+    writer.close()
+    return path
+
+
+def train(path, dtype):
+    """train.py's in-memory path: load, split, normalize and run SGD, all in *dtype*."""
+    X, y = load_data(path, dtype)
+    X_tr, y_tr, X_val, y_val = train_val_split(X, y)
+    mean, std = normalize_fit(X_tr)
+    X_tr, X_val = normalize_apply(X_tr, mean, std), normalize_apply(X_val, mean, std)
+    params = train_minibatch(X_tr, y_tr, X_val, y_val, OPTIMIZERS["sgd"](lr=0.01), EPOCHS, 64, patience=0,
+                             verbose=False)
+    p, _ = forward(X_val, params)
+    return params, mean, std, p, float(compute_loss(p, y_val))
+
+
+@pytest.fixture(scope="module")
+def runs(dataset):
+    return {dtype: train(dataset, dtype) for dtype in (np.float64, np.float32)}
+
+
+def test_float32_training_runs_in_float32(runs):
+    params, mean, std, p, _ = runs[np.float32]
+    assert all(v.dtype == np.float32 for v in params.values())
+    assert mean.dtype == std.dtype == p.dtype == np.float32
+
+
+def test_float32_training_matches_float64(runs):
+    *_, p64, loss64 = runs[np.float64]
+    *_, p32, loss32 = runs[np.float32]
+    assert np.abs(p32.astype(np.float64) - p64).max() <= PROBA_TOL
+    assert abs(loss32 - loss64) <= LOSS_TOL
+    assert ((p32 >= 0.5) != (p64 >= 0.5)).mean() <= FLIP_TOL
+
+
+def test_float32_predictor_matches_float64(runs, dataset):
+    params, mean, std, _, _ = runs[np.float64]
+    X, _ = load_data(dataset)
+    p64 = Predictor(params, mean, std, len(X), np.float64).predict_proba(X)
+    p32 = Predictor(params, mean, std, len(X), np.float32).predict_proba(X)
+    assert p32.dtype == np.float32
+    assert np.abs(p32.astype(np.float64) - p64).max() <= PREDICTOR_TOL
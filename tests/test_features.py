@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ml.features import batch_rows, extract, extract_batch, extract_inputs, lap_inputs
+from ml.oracle import label, label_batch
+from sim.event_race import EventRaceState
+from sim.race import RaceState
+from sim.track import Track
+
+TOTAL_LAPS = 50
+DT = 1.0 / 60
+STYLES = ["aggressive", "normal", "conservative", "aggressive", "normal"]
+ENGINES = {"frame": RaceState, "event": EventRaceState}
+
+
+def lap_completions(engine, n_races=3, seed=7):
+    """Step seeded races to the finish, yielding ``(state, races, slots)`` for every step with laps."""
+    track = Track.oval(center_x=600, center_y=400, radius_x=400, radius_y=250)
+    rngs = [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(k,))) for k in range(n_races)]
+    state = ENGINES[engine](track, [STYLES] * n_races, base_speed=1.0, rngs=rngs)
+    active = np.ones(n_races, dtype=bool)
+    while active.any():
+        races, slots = np.nonzero(state.step(DT, active))
+        if len(races):
+            yield state, races, slots
+        active &= ~(state.lap_count >= TOTAL_LAPS).all(axis=1)
+
+
+@pytest.fixture(scope="module", params=list(ENGINES))
+def laps(request):
+    """Per step: the batch features, the scalar extract() results and the lap_inputs of every lap."""
+    out = []
+    for state, races, slots in lap_completions(request.param):
+        scalar = [extract(state.race_cars(r)[i], state.race_cars(r), state.safety_car_active[r], TOTAL_LAPS)
+                  for r, i in zip(races.tolist(), slots.tolist())]
+        out.append((extract_batch(state, races, slots, TOTAL_LAPS), scalar, lap_inputs(state, races, slots)))
+    return out
+
+
+def test_races_cover_pits_traffic_and_safety_car(laps):
+    X = np.concatenate([x for x, _, _ in laps])
+    assert len(X) >= 3 * 5 * TOTAL_LAPS
+    assert (X[:, 1] < X[:, 7] * TOTAL_LAPS).any()   # someone has pitted
+    assert (X[:, 5] > 0).any() and (X[:, 6] == 1).any()
+    assert (X[:, 8] == 1).any()
+
+
+def test_extract_batch_rows_equal_extract(laps):
+    for X, scalar, _ in laps:
+        for batch_row, (_, row) in zip(batch_rows(X), scalar):
+            assert batch_row == row
+            assert [type(v) for v in batch_row] == [type(v) for v in row]
+
+
+def test_label_batch_equals_label(laps):
+    for X, scalar, _ in laps:
+        assert label_batch(X).tolist() == [label(d) for d, _ in scalar]
+
+
+def test_extract_inputs_equals_extract_batch(laps):
+    for X, _, inputs in laps:
+        np.testing.assert_array_equal(extract_inputs(inputs, TOTAL_LAPS), X)
+
+
+def test_extract_batch_empty():
+    state, _, _ = next(lap_completions("frame", n_races=1))
+    assert extract_batch(state, [], [], TOTAL_LAPS).shape == (0, 9)
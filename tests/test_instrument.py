@@ -0,0 +1,59 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sim.event_race import EventRaceState
+from sim.instrument import RACE_PHASES, Instrumentation
+from sim.race import RaceState
+from sim.track import Track
+
+TOTAL_LAPS = 50
+DT = 1.0 / 60
+STYLES = ["aggressive", "normal", "conservative", "aggressive", "normal"]
+ENGINES = {"frame": RaceState, "event": EventRaceState}
+
+
+def run(engine, instrumentation=None, n_races=3, seed=7):
+    """Run seeded races to the finish; return the state and the safety-car starts seen between steps."""
+    track = Track.oval(center_x=600, center_y=400, radius_x=400, radius_y=250)
+    rngs = [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(k,))) for k in range(n_races)]
+    state = ENGINES[engine](track, [STYLES] * n_races, base_speed=1.0, rngs=rngs)
+    if instrumentation is not None:
+        instrumentation.instrument_race(state)
+    active = np.ones(n_races, dtype=bool)
+    starts = 0
+    while active.any():
+        before = state.safety_car_active.copy()
+        state.step(DT, active)
+        starts += int((state.safety_car_active & ~before).sum())
+        active &= ~(state.lap_count >= TOTAL_LAPS).all(axis=1)
+    return state, starts
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+def test_event_counts(engine):
+    instrumentation = Instrumentation()
+    state, _ = run(engine, instrumentation)
+    _, starts = run(engine)
+    events = instrumentation.events
+    assert starts > 0
+    assert events["safety_car_periods"] == starts
+    assert events["laps"] == state.lap_count.sum()
+    assert events["pit_entries"] == state.pit_stops.sum()
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+def test_every_engine_phase_is_timed(engine):
+    instrumentation = Instrumentation()
+    run(engine, instrumentation, n_races=1)
+    phases = set(RACE_PHASES[ENGINES[engine].__name__].values())
+    assert set(instrumentation.seconds) == phases
+    assert all(instrumentation.calls[phase] > 0 for phase in phases)
@@ -0,0 +1,49 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ml.collect_data import cached_races, lap_cache, race_chunks, simulate_races
+from ml.lap_cache import LapCache, code_text
+
+RACES = 6
+ENGINE = "event"
+
+
+def plain(x):
+    return x + 1
+
+
+def commented(x):
+    """Add one."""
+    # a comment
+    return (x
+            + 1)
+
+
+def changed(x):
+    return x + 2
+
+
+def body(fn):
+    """code_text of *fn* without its ``def`` line, which names it."""
+    return code_text(fn).split("\n", 1)[1]
+
+
+def test_code_text_ignores_comments_docstrings_and_layout():
+    assert body(plain) == body(commented)
+    assert body(plain) != body(changed)
+
+
+def test_cached_races_match_direct_simulation(tmp_path):
+    version = lap_cache(0, ENGINE)
+    cache = LapCache(version.dir.name, version.features, version.oracle, version.total_laps, root=tmp_path)
+    direct = [rows for _, runs in simulate_races(race_chunks(RACES, RACES), 0, engine=ENGINE) for rows in runs]
+    for races, workers in [(RACES // 2, 2), (RACES, 3), (RACES, 1)]:
+        got = [rows for _, runs in cached_races(cache, race_chunks(races, 1000), 0, workers, ENGINE) for rows in runs]
+        assert got == direct[:races]
+    assert cache.computed["races simulated"] == RACES
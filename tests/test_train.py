@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "ml"))
+
+from train import normalize_fit, normalize_fit_streaming, stream_blocks
+
+ROWS = 5000
+BLOCK_ROWS = 700
+
+
+def test_streamed_statistics_match_normalize_fit_with_large_offsets():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(ROWS, 3)) * [1.0, 1e-3, 5.0] + [0.0, 1e8, -3e6]
+    y = rng.integers(0, 2, (ROWS, 1)).astype(np.float64)
+    X_tr = np.concatenate([Xb for Xb, _ in stream_blocks(X, y, "train", BLOCK_ROWS)])
+    mean, std = normalize_fit(X_tr)
+    mean_s, std_s = normalize_fit_streaming(X, y, BLOCK_ROWS)
+    np.testing.assert_allclose(mean_s, mean, rtol=1e-12)
+    np.testing.assert_allclose(std_s, std, rtol=1e-7)